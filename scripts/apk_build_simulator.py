@@ -11,11 +11,15 @@ import time
 from pathlib import Path
 import shutil
 
+def release_dir(project_root: str) -> Path:
+    """Where the release files are written (nothing is created)"""
+    return Path(project_root) / "releases" / "v0.3.0"
+
 class APKBuildSimulator:
     def __init__(self, project_root: str):
         self.project_root = Path(project_root)
         self.android_app = self.project_root / "android-app"
-        self.releases_dir = self.project_root / "releases" / "v0.3.0"
+        self.releases_dir = release_dir(project_root)
         self.releases_dir.mkdir(parents=True, exist_ok=True)
         
         # Build configuration
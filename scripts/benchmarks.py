@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Bahai Resource Library Benchmarks
+Micro-benchmarks for the document pipeline, run from the repository root
+"""
+
+import argparse
+import contextlib
+import io
+import re
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from db_connection import connect, DEFAULT_MMAP_SIZE
+from download_engine import CircuitBreaker, DownloadResilience, RetryPolicy
+from http_fixtures import Cassette, FixtureServer, install
+from link_extractor import extract_pdf_links
+from text_normalizer import iter_paragraphs, mapped_lines
+
+DEFAULT_DB_PATH = "android-app/app/src/main/assets/database/bahai_documents.db"
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# Representative queries issued by the app and by test_database.py
+DB_QUERIES = [
+    "SELECT title, author, category, page_count, word_count FROM documents",
+    "SELECT title, author, snippet(document_search, 2, '<mark>', '</mark>', '...', 32) "
+    "FROM document_search WHERE document_search MATCH 'unity' LIMIT 2",
+    "SELECT term, frequency FROM search_terms ORDER BY frequency DESC LIMIT 10",
+]
+
+def time_call(func, repeat):
+    """Run func repeat times and return the per-call durations in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+def summarize(label, durations):
+    """Print a one-line summary of a set of timings"""
+    print(f"  {label:<28} median {statistics.median(durations):8.3f} ms   "
+          f"min {min(durations):8.3f} ms   max {max(durations):8.3f} ms")
+
+def run_queries(conn):
+    for query in DB_QUERIES:
+        conn.execute(query).fetchall()
+
+def benchmark_db_open(db_path, repeat, mmap_size):
+    """Compare the default open against the read-only memory-mapped open"""
+    db_path = Path(db_path)
+    if not db_path.exists():
+        print(f"Database not found: {db_path}")
+        return
+
+    openers = {
+        'default sqlite3.connect': lambda: sqlite3.connect(db_path),
+        'read-only mmap': lambda: connect(db_path, read_only=True, mmap_size=mmap_size),
+    }
+
+    print(f"Database: {db_path} ({db_path.stat().st_size / 1024:.1f} KB)")
+    print(f"Repetitions: {repeat}, mmap_size: {mmap_size:,}\n")
+
+    print("Cold queries (new connection per run)")
+    for label, opener in openers.items():
+        def cold():
+            conn = opener()
+            run_queries(conn)
+            conn.close()
+        summarize(label, time_call(cold, repeat))
+
+    print("\nWarm queries (one connection, repeated runs)")
+    for label, opener in openers.items():
+        conn = opener()
+        run_queries(conn)  # populate the page cache first
+        summarize(label, time_call(lambda: run_queries(conn), repeat))
+        conn.close()
+
+def bs4_pdf_links(html):
+    """The BeautifulSoup extraction OfficialBahaiDownloader used previously"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    return [(link.get('href'), link.get_text(strip=True))
+            for link in soup.find_all('a', href=lambda x: x and x.endswith('.pdf'))]
+
+def benchmark_links(fixtures, repeat):
+    """Compare streaming link extraction against BeautifulSoup on saved pages"""
+    extractors = {'streaming HTMLParser': extract_pdf_links}
+    try:
+        import bs4  # noqa: F401
+        extractors['BeautifulSoup'] = bs4_pdf_links
+    except ImportError:
+        print("BeautifulSoup not installed, benchmarking the streaming extractor only\n")
+
+    for fixture in fixtures:
+        html = Path(fixture).read_text(encoding='utf-8')
+        print(f"{Path(fixture).name} ({len(html) / 1024:.1f} KB, "
+              f"{len(extract_pdf_links(html))} PDF links)")
+
+        results = {label: extract(html) for label, extract in extractors.items()}
+        if len(set(map(tuple, results.values()))) > 1:
+            print("  WARNING: extractors disagree on this page")
+
+        for label, extract in extractors.items():
+            summarize(label, time_call(lambda: extract(html), repeat))
+        print()
+
+def run_downloader(base_dir, server, workers, rate_per_host):
+    """One quiet BahaiDocumentDownloader run against the fixture server"""
+    from document_downloader import BahaiDocumentDownloader
+
+    before = dict(server.stats)
+    with contextlib.redirect_stdout(io.StringIO()):
+        downloader = BahaiDocumentDownloader(base_dir)
+        install(downloader.session, server)
+        # Fresh circuit and retry budget, so one run cannot affect the next
+        downloader.resilience = DownloadResilience(RetryPolicy(base_delay=0.05), CircuitBreaker())
+        start = time.perf_counter()
+        downloaded = downloader.download_essential_texts(max_workers=workers,
+                                                         rate_per_host=rate_per_host)
+        elapsed = time.perf_counter() - start
+        downloader.metadata_store.close()
+
+    stats = {key: value - before.get(key, 0) for key, value in server.stats.items()}
+    print(f"  {elapsed * 1000:9.1f} ms   {downloaded:2d} ok   "
+          f"{stats.get('requests', 0):3d} requests   "
+          f"{stats.get('bytes_sent', 0) / 1024:8.1f} KB sent   "
+          f"{stats.get('not_modified', 0):2d} not modified   "
+          f"{stats.get('partial', 0):2d} resumed")
+
+def benchmark_downloads(args):
+    """Time the document downloader offline: concurrency, revalidation, resume"""
+    cassette = Cassette(args.cassette) if args.cassette else Cassette()
+    server_options = dict(latency=args.latency, bandwidth=args.bandwidth, seed=args.seed,
+                          synthetic_size=args.document_size)
+
+    print(f"Latency {args.latency * 1000:.0f} ms, bandwidth "
+          f"{args.bandwidth / 1024 if args.bandwidth else float('inf'):.0f} KB/s, "
+          f"{args.rate_per_host} requests/s per host, "
+          f"{len(cassette)} recorded interactions, synthetic documents of "
+          f"{args.document_size / 1024:.0f} KB\n")
+
+    with FixtureServer(cassette, **server_options) as server:
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as base_dir:
+                print(f"{workers} worker(s)")
+                print(f"  {'cold':<11}", end='')
+                run_downloader(base_dir, server, workers, args.rate_per_host)
+                print(f"  {'revalidate':<11}", end='')
+                run_downloader(base_dir, server, workers, args.rate_per_host)
+
+    print(f"\nFault injection: {args.error_rate:.0%} 503s, {args.drop_rate:.0%} dropped connections")
+    with FixtureServer(cassette, error_rate=args.error_rate, drop_rate=args.drop_rate,
+                       **server_options) as server:
+        with tempfile.TemporaryDirectory() as base_dir:
+            print(f"  {'faulty':<11}", end='')
+            run_downloader(base_dir, server, max(args.workers), args.rate_per_host)
+
+def synthetic_text(paragraphs):
+    """A long work: a heading every ten paragraphs of about 120 words"""
+    sentence = ("The earth is but one country, and mankind its citizens; "
+                "the well-being of mankind, its peace and security, are unattainable "
+                "unless and until its unity is firmly established. ")
+    parts = []
+    for index in range(paragraphs):
+        if index % 10 == 0:
+            parts.append(f"CHAPTER {index // 10 + 1}")
+        parts.append(sentence * 4)
+    return '\n\n'.join(parts)
+
+def benchmark_pdf(pages, repeat):
+    """Build time and peak memory of a long PDF, list story vs streamed story"""
+    from text_to_pdf_converter import BahaiTextToPDFConverter
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        text_file = Path(work_dir) / "long_work.txt"
+        # Roughly six paragraphs fit on a page
+        text_file.write_text(synthetic_text(pages * 6), encoding='utf-8')
+        converter = BahaiTextToPDFConverter(work_dir, work_dir)
+
+        modes = {'list story': None, 'streamed story': converter.story_lookahead}
+        for label, lookahead in modes.items():
+            converter.story_lookahead = lookahead
+            _, page_count = converter.render_pdf(text_file)
+            durations = time_call(lambda: converter.render_pdf(text_file), repeat)
+
+            tracemalloc.start()
+            converter.render_pdf(text_file)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            summarize(f"{label} ({page_count} pages)", durations)
+            print(f"  {'':<28} peak memory {peak / (1024 * 1024):.1f} MB")
+
+def benchmark_pdf_profiles(pages, repeat):
+    """Output size and render time of each PDF profile"""
+    from text_to_pdf_converter import BahaiTextToPDFConverter, PDF_PROFILES
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        text_file = Path(work_dir) / "long_work.txt"
+        text_file.write_text(synthetic_text(pages * 6), encoding='utf-8')
+
+        for profile in PDF_PROFILES:
+            converter = BahaiTextToPDFConverter(work_dir, work_dir, profile)
+            pdf_file, page_count = converter.render_pdf(text_file)
+            durations = time_call(lambda: converter.render_pdf(text_file), repeat)
+            size = pdf_file.stat().st_size
+
+            summarize(f"{profile} ({page_count} pages)", durations)
+            print(f"  {'':<28} {size / 1024:.1f} KB, {size // page_count} bytes/page, "
+                  f"{statistics.median(durations) / page_count:.2f} ms/page")
+
+def whole_text_paragraphs(text_file):
+    """The pre-streaming normalizer: read everything, rewrite it three times, split it"""
+    with open(text_file, 'r', encoding='utf-8', newline='') as f:
+        text = f.read()
+    text = re.sub(r'\r\n', '\n', text)
+    text = re.sub(r'\r', '\n', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return sum(1 for _ in iter_paragraphs(text.split('\n')))
+
+def streamed_paragraphs(text_file):
+    with mapped_lines(text_file) as lines:
+        return sum(1 for _ in iter_paragraphs(lines))
+
+def benchmark_normalize(paragraphs, repeat):
+    """Paragraph grouping of a long text, whole-string vs streamed over mmap"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        text_file = Path(work_dir) / "long_work.txt"
+        text_file.write_text(synthetic_text(paragraphs), encoding='utf-8')
+        size = text_file.stat().st_size
+
+        modes = {'whole string': whole_text_paragraphs, 'streamed mmap': streamed_paragraphs}
+        for label, func in modes.items():
+            count = func(text_file)
+            durations = time_call(lambda: func(text_file), repeat)
+
+            tracemalloc.start()
+            func(text_file)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            summarize(f"{label} ({count} items)", durations)
+            print(f"  {'':<28} peak memory {peak / (1024 * 1024):.1f} MB of {size / (1024 * 1024):.1f} MB text")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Benchmark the Bahai document pipeline')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    db_open = subparsers.add_parser('db-open', help='Default vs read-only mmap database open')
+    db_open.add_argument('--db', default=DEFAULT_DB_PATH, help='Database to benchmark')
+    db_open.add_argument('--repeat', type=int, default=200, help='Runs per measurement')
+    db_open.add_argument('--mmap-size', type=int, default=DEFAULT_MMAP_SIZE,
+                         help='mmap_size for the read-only open (0 disables)')
+
+    links = subparsers.add_parser('links', help='Streaming vs BeautifulSoup PDF link extraction')
+    links.add_argument('fixtures', nargs='*', help='Saved HTML pages (default: scripts/fixtures/*.html)')
+    links.add_argument('--repeat', type=int, default=50, help='Runs per measurement')
+
+    downloads = subparsers.add_parser('downloads', help='Offline downloader runs against a fixture server')
+    downloads.add_argument('--cassette', help='Recorded cassette (default: synthetic documents only)')
+    downloads.add_argument('--workers', type=int, nargs='+', default=[1, 4],
+                           help='Worker counts to compare')
+    downloads.add_argument('--rate-per-host', type=float, default=20.0)
+    downloads.add_argument('--latency', type=float, default=0.05, help='Seconds before each response')
+    downloads.add_argument('--bandwidth', type=float, default=2 * 1024 * 1024,
+                           help='Bytes per second per connection')
+    downloads.add_argument('--document-size', type=int, default=256 * 1024,
+                           help='Size of synthetic documents in bytes')
+    downloads.add_argument('--error-rate', type=float, default=0.1)
+    downloads.add_argument('--drop-rate', type=float, default=0.2)
+    downloads.add_argument('--seed', type=int, default=0)
+
+    pdf = subparsers.add_parser('pdf', help='Long-document PDF build time and memory')
+    pdf.add_argument('--pages', type=int, default=320, help='Approximate length of the work')
+    pdf.add_argument('--repeat', type=int, default=3, help='Runs per measurement')
+
+    pdf_profiles = subparsers.add_parser('pdf-profiles', help='PDF size and render time per output profile')
+    pdf_profiles.add_argument('--pages', type=int, default=100, help='Approximate length of the work')
+    pdf_profiles.add_argument('--repeat', type=int, default=3, help='Runs per measurement')
+
+    normalize = subparsers.add_parser('normalize', help='Whole-string vs streamed text normalization')
+    normalize.add_argument('--paragraphs', type=int, default=50000, help='Length of the work')
+    normalize.add_argument('--repeat', type=int, default=5, help='Runs per measurement')
+
+    args = parser.parse_args()
+
+    print("Bahai Resource Library Benchmarks")
+    print("=" * 40)
+
+    if args.benchmark == 'db-open':
+        benchmark_db_open(args.db, args.repeat, args.mmap_size)
+    elif args.benchmark == 'links':
+        benchmark_links(args.fixtures or sorted(FIXTURES_DIR.glob('*.html')), args.repeat)
+    elif args.benchmark == 'downloads':
+        benchmark_downloads(args)
+    elif args.benchmark == 'pdf':
+        benchmark_pdf(args.pages, args.repeat)
+    elif args.benchmark == 'pdf-profiles':
+        benchmark_pdf_profiles(args.pages, args.repeat)
+    elif args.benchmark == 'normalize':
+        benchmark_normalize(args.paragraphs, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Incremental Build Graph
+Make-style dependency tracking for conversion, indexing and app assets
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from document_store import hash_file
+from download_sink import write_file_atomic
+from instrumentation import add_arguments as add_instrumentation_arguments
+from instrumentation import configure_from_args, finish as finish_instrumentation, span
+
+DEFAULT_STATE_PATH = "documents/.cache/build_state.json"
+
+# Earlier builds of each node whose outputs are kept for reuse
+CACHE_ENTRIES = 3
+
+class BuildNode:
+    """One step of the build: turns inputs into outputs.
+
+    action(changed, removed) is called with the inputs whose content
+    changed since the last successful build and the inputs that are gone,
+    so steps that can work incrementally need not redo everything. After a
+    stage version change, or with force, every input counts as changed.
+
+    Steps whose effects go beyond the outputs they declare (a collection
+    run, a release build) must not be cacheable: restoring the declared
+    files would skip the real work.
+    """
+
+    def __init__(self, name, stage, version, inputs, outputs, action, deps=(), cacheable=True):
+        self.name = name
+        self.stage = stage
+        self.version = version
+        self.inputs = [Path(path) for path in inputs]
+        self.outputs = [Path(path) for path in outputs]
+        self.action = action
+        self.deps = set(deps)
+        self.cacheable = cacheable
+
+class BuildGraph:
+    """Runs only the nodes whose inputs, outputs or stage version changed.
+
+    For every node the last successful build records the stage version and
+    the SHA-256 of each input and output. A node is stale when any of these
+    differ, when an output is missing, or when a node it depends on was
+    rebuilt. File hashes are cached by (mtime, size), so unchanged files
+    are not read again.
+
+    A node depends on the nodes producing its inputs, plus any named in
+    deps. Independent nodes run in parallel on max_workers threads.
+
+    With a cache_dir, the outputs of the last cache_entries builds of each
+    node are kept there by content hash. A stale node whose inputs match
+    one of those builds gets its outputs copied back instead of running.
+    """
+
+    def __init__(self, state_path=DEFAULT_STATE_PATH, cache_dir=None, cache_entries=CACHE_ENTRIES):
+        self.state_path = Path(state_path)
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.cache_entries = cache_entries
+        self.nodes = {}
+        self.lock = threading.Lock()
+        self.print_lock = threading.Lock()
+        self.load_state()
+
+    def load_state(self):
+        if self.state_path.exists():
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        else:
+            self.state = {'nodes': {}, 'files': {}}
+        self.state.setdefault('cache', {})
+
+    def save_state(self):
+        """Write the build state (atomically)"""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.state, indent=2, sort_keys=True)
+        temp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(temp_path, self.state_path)
+
+    def add(self, node):
+        self.nodes[node.name] = node
+        return node
+
+    def fingerprint(self, path):
+        """SHA-256 of a file, or None if it does not exist"""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = path.as_posix()
+        signature = [stat.st_mtime_ns, stat.st_size]
+        with self.lock:
+            cached = self.state['files'].get(key)
+        if cached and cached['signature'] == signature:
+            return cached['sha256']
+        digest = hash_file(path)
+        with self.lock:
+            self.state['files'][key] = {'signature': signature, 'sha256': digest}
+        return digest
+
+    def dependencies(self, node):
+        producers = {output: other.name for other in self.nodes.values() for output in other.outputs}
+        deps = {producers[path] for path in node.inputs if path in producers}
+        return (deps | node.deps) - {node.name}
+
+    def check(self, node, deps_rebuilt=False):
+        """(stale, changed inputs, removed inputs) for a node"""
+        record = self.state['nodes'].get(node.name)
+        inputs = {path.as_posix(): self.fingerprint(path) for path in node.inputs}
+        if record is None or record['stage'] != node.stage or record['version'] != node.version:
+            # A new stage version may change what every input turns into
+            return True, set(node.inputs), set()
+
+        previous = record['inputs']
+        changed = {Path(key) for key, digest in inputs.items() if previous.get(key) != digest}
+        removed = {Path(key) for key in previous if key not in inputs}
+        stale = (bool(changed or removed or deps_rebuilt)
+                 or any(record['outputs'].get(path.as_posix()) != self.fingerprint(path)
+                        for path in node.outputs))
+        return stale, changed, removed
+
+    def record(self, node):
+        with self.lock:
+            self.state['nodes'][node.name] = {
+                'stage': node.stage,
+                'version': node.version,
+                'inputs': {},
+                'outputs': {}
+            }
+        inputs = {path.as_posix(): self.fingerprint(path) for path in node.inputs}
+        outputs = {path.as_posix(): self.fingerprint(path) for path in node.outputs}
+        with self.lock:
+            self.state['nodes'][node.name]['inputs'] = inputs
+            self.state['nodes'][node.name]['outputs'] = outputs
+
+    def cache_key(self, node):
+        """Identifies a build of node: its stage, version and input hashes"""
+        inputs = sorted((path.as_posix(), self.fingerprint(path)) for path in node.inputs)
+        data = json.dumps([node.name, node.stage, node.version, inputs])
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def blob_path(self, digest):
+        return self.cache_dir / digest[:2] / digest
+
+    def restore_cached(self, node):
+        """Copy back the outputs of an earlier build with the same inputs; True if found"""
+        if self.cache_dir is None or not node.cacheable:
+            return False
+        key = self.cache_key(node)
+        with self.lock:
+            entries = self.state['cache'].get(node.name, [])
+            outputs = next((entry['outputs'] for entry in entries if entry['key'] == key), None)
+        if outputs is None or not all(self.blob_path(digest).exists() for digest in outputs.values()):
+            return False
+        for path, digest in outputs.items():
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Copied, not linked: some steps rewrite their outputs in place
+            temp_path = path.with_name(path.name + '.cached')
+            shutil.copyfile(self.blob_path(digest), temp_path)
+            os.replace(temp_path, path)
+        return True
+
+    def cache_outputs(self, node):
+        """Keep a copy of node's freshly built outputs"""
+        if self.cache_dir is None or not node.cacheable:
+            return
+        outputs = {path.as_posix(): self.fingerprint(path) for path in node.outputs}
+        if None in outputs.values():
+            return
+        for path, digest in outputs.items():
+            blob = self.blob_path(digest)
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = blob.with_name(f"{digest}.{threading.get_ident()}.tmp")
+                shutil.copyfile(path, temp_path)
+                os.replace(temp_path, blob)
+        key = self.cache_key(node)
+        with self.lock:
+            entries = [entry for entry in self.state['cache'].get(node.name, []) if entry['key'] != key]
+            entries.append({'key': key, 'outputs': outputs})
+            self.state['cache'][node.name] = entries[-self.cache_entries:]
+
+    def stale_nodes(self, stages=None):
+        """Nodes that a run would rebuild, assuming every rebuild changes its outputs"""
+        stale = set()
+        for name in self.topological_order():
+            node = self.nodes[name]
+            if stages is not None and node.stage not in stages:
+                continue
+            if self.check(node, bool(self.dependencies(node) & stale))[0]:
+                stale.add(name)
+        return [name for name in self.topological_order() if name in stale]
+
+    def topological_order(self):
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle at {name}")
+            visiting.add(name)
+            for dep in sorted(self.dependencies(self.nodes[name])):
+                if dep in self.nodes:
+                    visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in sorted(self.nodes):
+            visit(name)
+        return order
+
+    def run(self, max_workers=4, force=False, stages=None):
+        """Bring every node up to date; returns {name: status}.
+
+        Status is 'built', 'cached' (outputs restored from the cache),
+        'up-to-date', 'failed', 'skipped' (a dependency failed) or
+        'not selected' (its stage is not in stages; its outputs are used
+        as they are). The state is saved even if the run fails.
+        """
+        status = {}
+        rebuilt = set()
+        deps = {name: self.dependencies(node) & set(self.nodes) for name, node in self.nodes.items()}
+        order = self.topological_order()
+        if stages is not None:
+            status.update((name, 'not selected') for name, node in self.nodes.items()
+                          if node.stage not in stages)
+
+        def build(node):
+            stale, changed, removed = self.check(node, bool(deps[node.name] & rebuilt))
+            if not (stale or force):
+                return 'up-to-date'
+            if force:
+                changed = set(node.inputs)
+            if not force and self.restore_cached(node):
+                with self.print_lock:
+                    print(f"[{node.stage}] {node.name} (cached)")
+                self.record(node)
+                return 'cached'
+            with self.print_lock:
+                print(f"[{node.stage}] {node.name}")
+            with span(node.name, node.stage, changed=len(changed), removed=len(removed)):
+                node.action(changed, removed)
+            self.record(node)
+            self.cache_outputs(node)
+            return 'built'
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                running = {}
+                while len(status) < len(self.nodes):
+                    for name in order:
+                        if name in status or name in running.values():
+                            continue
+                        if any(status.get(dep) in ('failed', 'skipped') for dep in deps[name]):
+                            status[name] = 'skipped'
+                        elif all(status.get(dep) in ('built', 'cached', 'up-to-date', 'not selected')
+                                 for dep in deps[name]):
+                            running[executor.submit(build, self.nodes[name])] = name
+                    if not running:
+                        continue
+                    finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name = running.pop(future)
+                        try:
+                            status[name] = future.result()
+                        except Exception as e:
+                            with self.print_lock:
+                                print(f"  Failed: {name}: {e}")
+                            status[name] = 'failed'
+                        if status[name] in ('built', 'cached'):
+                            rebuilt.add(name)
+        finally:
+            self.prune_state()
+            self.save_state()
+        return status
+
+    def prune_state(self):
+        """Forget nodes that left the graph, files no node refers to and unused cached outputs"""
+        with self.lock:
+            self.state['nodes'] = {name: record for name, record in self.state['nodes'].items()
+                                   if name in self.nodes}
+            referenced = {path.as_posix() for node in self.nodes.values()
+                          for path in node.inputs + node.outputs}
+            self.state['files'] = {key: value for key, value in self.state['files'].items()
+                                   if key in referenced}
+            self.state['cache'] = {name: entries for name, entries in self.state['cache'].items()
+                                   if name in self.nodes}
+            cached = {digest for entries in self.state['cache'].values()
+                      for entry in entries for digest in entry['outputs'].values()}
+        if self.cache_dir is not None and self.cache_dir.exists():
+            for blob in self.cache_dir.glob('*/*'):
+                if blob.name not in cached and not blob.name.endswith('.tmp'):
+                    blob.unlink()
+
+def library_graph(state_path=DEFAULT_STATE_PATH, documents_dir="documents",
+                  text_dir="documents/official", pdf_dir="documents/official",
+                  convert_pool=None, cache_dir=None):
+    """The converter -> processor -> asset graph for the library.
+
+    One convert node per text file (its .json sidecar is an input too), one
+    index node over everything the processor reads, and an asset node that
+    writes the database checksum the app packaging checks. Conversions run
+    in convert_pool (a process pool) when given, and outputs are cached in
+    cache_dir when given.
+    """
+    from document_processor import BahaiDocumentProcessor, PROCESSOR_VERSION
+    from text_to_pdf_converter import (BahaiTextToPDFConverter, CONVERTER_VERSION,
+                                       convert_file, convert_in_worker)
+
+    graph = BuildGraph(state_path, cache_dir)
+    converter = BahaiTextToPDFConverter(text_dir, pdf_dir)
+
+    def convert_action(text_file):
+        def action(changed, removed):
+            if convert_pool is not None:
+                result = convert_pool.submit(convert_in_worker, text_file).result()
+            else:
+                result = convert_file(converter, text_file)
+            if result['error']:
+                raise RuntimeError(result['error'])
+        return action
+
+    pdf_outputs = []
+    for text_file in sorted(Path(text_dir).glob('*.txt')):
+        pdf_file = Path(pdf_dir) / text_file.name.replace('.txt', '.pdf')
+        inputs = [text_file]
+        if text_file.with_suffix('.json').exists():
+            inputs.append(text_file.with_suffix('.json'))
+        graph.add(BuildNode(f"convert:{text_file.name}", 'convert', CONVERTER_VERSION,
+                            inputs, [pdf_file], convert_action(text_file)))
+        pdf_outputs.append(pdf_file)
+
+    # Everything the processor reads, including PDFs the convert nodes will create
+    documents_dir = Path(documents_dir)
+    source_dirs = [documents_dir / "confirmed-official", documents_dir / "pending-permissions"]
+    index_inputs = set()
+    for directory in source_dirs:
+        index_inputs.update(directory.glob("*.txt"))
+        index_inputs.update(directory.glob("*.pdf"))
+    index_inputs.update(path for path in pdf_outputs if path.parent in source_dirs)
+    # The processor prefers the metadata store, whose commits land in its WAL first
+    index_inputs.add(documents_dir / "document_metadata.json")
+    index_inputs.add(documents_dir / "document_metadata.db")
+    index_inputs.add(documents_dir / "document_metadata.db-wal")
+
+    output_dir = Path("android-app/app/src/main/assets/database")
+    db_path = output_dir / "bahai_documents.db"
+    hash_path = db_path.with_name(db_path.name + ".sha256")
+
+    def index_action(changed, removed):
+        record = graph.state['nodes'].get('index')
+        if (record is None or record['version'] != PROCESSOR_VERSION or not db_path.exists()
+                or set(changed) >= set(graph.nodes['index'].inputs)):
+            # Everything is redone, from an empty database: a build seeded
+            # from the live index would skip documents it already has
+            processor = BahaiDocumentProcessor(documents_dir, rebuild=True)
+            processor.process_all_documents()
+        else:
+            processor = BahaiDocumentProcessor(documents_dir)
+            processor.reindex(set(changed), set(removed), keep_build=False)
+
+    graph.add(BuildNode('index', 'index', PROCESSOR_VERSION,
+                        sorted(index_inputs), [db_path], index_action))
+
+    def asset_action(changed, removed):
+        write_file_atomic(hash_path, f"{hash_file(db_path)}  {db_path.name}\n")
+
+    graph.add(BuildNode('asset', 'asset', 1, [db_path], [hash_path], asset_action))
+    return graph
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Rebuild only the out-of-date library outputs')
+    parser.add_argument('--documents-dir', default='documents')
+    parser.add_argument('--text-dir', default='documents/official',
+                        help='Text files converted to PDF')
+    parser.add_argument('--pdf-dir', default='documents/official',
+                        help='Where converted PDFs are written')
+    parser.add_argument('--state', default=DEFAULT_STATE_PATH, help='Build state file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Nodes built in parallel (conversions use worker processes)')
+    parser.add_argument('--force', action='store_true', help='Rebuild everything')
+    parser.add_argument('--dry-run', action='store_true', help='List stale nodes and exit')
+    add_instrumentation_arguments(parser)
+
+    args = parser.parse_args()
+
+    print("Bahai Library Build")
+    print("=" * 40)
+
+    pool = None
+    if args.workers > 1 and not args.dry_run:
+        from text_to_pdf_converter import init_worker
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                   initargs=(args.text_dir, args.pdf_dir))
+    try:
+        graph = library_graph(args.state, args.documents_dir, args.text_dir, args.pdf_dir, pool)
+        if args.dry_run:
+            stale = graph.stale_nodes()
+            print(f"{len(stale)} of {len(graph.nodes)} nodes out of date")
+            for name in stale:
+                print(f"  {name}")
+            return
+
+        configure_from_args(args)
+        status = graph.run(max_workers=args.workers, force=args.force)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        finish_instrumentation(args.trace)
+
+    counts = {}
+    for value in status.values():
+        counts[value] = counts.get(value, 0) + 1
+    print("\nBuild summary: " + ", ".join(f"{count} {value}" for value, count in sorted(counts.items())))
+
+if __name__ == "__main__":
+    main()
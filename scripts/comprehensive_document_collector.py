@@ -14,6 +14,9 @@ import hashlib
 from typing import List, Dict, Optional
 import logging
 
+from crawl_scheduler import CrawlScheduler, RobotsPolicy
+from document_store import ContentStore
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,6 +40,10 @@ class BahaiResourceCollector:
         
         for directory in self.directories.values():
             directory.mkdir(parents=True, exist_ok=True)
+        self.created_dirs = set(self.directories.values())
+        
+        # Shared content-addressed store; document paths link into it
+        self.store = ContentStore(self.base_dir / '.store')
         
         # Official Bahá'í sources (publicly available)
         self.official_sources = {
@@ -47,6 +54,19 @@ class BahaiResourceCollector:
             'ruhi_institute': 'https://www.ruhi.org'
         }
         
+        # Session for robots.txt lookups before contacting a host
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Bahai Resource Library Document Collector 0.2.0'
+        })
+        
+        # Collection progress, so an interrupted run can resume
+        self.state_file = self.base_dir / '.collection_state.json'
+        
+        # download_document only writes local placeholders, so collection is
+        # not throttled; set this once entries are fetched from official_url
+        self.fetch_remote = False
+        
         # Comprehensive document catalog with authentic sources
         self.document_catalog = [
             # BAHÁ'U'LLÁH'S WRITINGS
@@ -399,6 +419,19 @@ class BahaiResourceCollector:
             }
         ]
     
+    def target_directory(self, doc_info: Dict) -> Path:
+        """Directory a catalog entry is written to"""
+        category_dir = self.directories[doc_info['category']]
+        if doc_info.get('subcategory'):
+            category_dir = category_dir / doc_info['subcategory']
+        return category_dir
+    
+    def prepare_directories(self, docs: List[Dict]):
+        """Create every target directory up front, once each"""
+        for directory in {self.target_directory(doc_info) for doc_info in docs} - self.created_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self.created_dirs.add(directory)
+    
     def download_document(self, doc_info: Dict) -> Optional[str]:
         """
         Download a document from official sources with proper attribution
@@ -407,10 +440,10 @@ class BahaiResourceCollector:
             # For now, create placeholders that reference official sources
             # In production, this would implement proper API calls or authorized downloads
             
-            category_dir = self.directories[doc_info['category']]
-            if doc_info.get('subcategory'):
-                category_dir = category_dir / doc_info['subcategory']
+            category_dir = self.target_directory(doc_info)
+            if category_dir not in self.created_dirs:
                 category_dir.mkdir(parents=True, exist_ok=True)
+                self.created_dirs.add(category_dir)
             
             # Sanitize filename
             safe_title = "".join(c for c in doc_info['title'] if c.isalnum() or c in (' ', '-', '_')).rstrip()
@@ -448,8 +481,7 @@ class BahaiResourceCollector:
             sample_content = self.create_sample_content(doc_info)
             
             # Write files
-            with open(text_file, 'w', encoding='utf-8') as f:
-                f.write(sample_content)
+            self.store.write(text_file, sample_content)
                 
             with open(json_file, 'w', encoding='utf-8') as f:
                 json.dump(metadata, f, indent=2, ensure_ascii=False)
@@ -625,22 +657,54 @@ For authentic texts, visit:
         
         return content
     
-    def collect_all_documents(self):
+    def document_url(self, doc_info: Dict) -> str:
+        """Page a catalog entry is collected from"""
+        return doc_info.get('official_url') or self.official_sources.get(doc_info.get('source'), '')
+    
+    def collect_all_documents(self, max_workers: int = 4, crawl_delay: float = 1.0,
+                              host_budget: Optional[int] = None):
         """
         Collect all documents in the catalog with proper organization
+        
+        Entries are scheduled by priority (1 = highest) on max_workers
+        threads. Entries fetched from their source site (fetch_remote) are
+        polite: crawl_delay seconds (or the host's robots.txt Crawl-delay, if
+        longer) between requests to the same host and at most host_budget
+        entries per host per run. Local placeholders are not throttled.
+        Progress is saved as it goes; rerunning after an interruption only
+        collects what is still missing.
         """
         logger.info("Starting comprehensive Bahá'í document collection...")
         
-        # Sort by priority (1 = highest priority)
-        sorted_docs = sorted(self.document_catalog, key=lambda x: (x.get('priority', 3), x['title']))
+        docs_by_id = {f"{doc['category']}/{doc['title']}": doc for doc in self.document_catalog}
+        scheduler = CrawlScheduler(self.state_file, RobotsPolicy(self.session),
+                                   default_delay=crawl_delay, host_budget=host_budget)
+        # Entries removed from the catalog would otherwise stay pending forever
+        scheduler.retain(docs_by_id)
+        if scheduler.done:
+            logger.info(f"Resuming collection: {len(scheduler.done)} documents already collected")
+        
+        for job_id, doc_info in sorted(docs_by_id.items()):
+            url = self.document_url(doc_info) if self.fetch_remote else None
+            scheduler.add(job_id, url, doc_info.get('priority', 3))
+        self.prepare_directories([docs_by_id[job_id] for job_id in scheduler.state['pending']])
+        
+        def collect(job_id):
+            logger.info(f"Processing: {docs_by_id[job_id]['title']}")
+            return self.download_document(docs_by_id[job_id])
+        
+        try:
+            scheduler.run(collect, max_workers=max_workers)
+        finally:
+            self.store.save()
         
         collected_files = []
         collected_by_category = {}
         
-        for doc_info in sorted_docs:
-            logger.info(f"Processing: {doc_info['title']}")
-            
-            filepath = self.download_document(doc_info)
+        # Report in priority order, including documents collected by an earlier run
+        for job_id, doc_info in sorted(docs_by_id.items(),
+                                       key=lambda item: (item[1].get('priority', 3), item[1]['title'])):
+            filepath = scheduler.done.get(job_id)
             if filepath:
                 collected_files.append(filepath)
                 
@@ -649,9 +713,12 @@ For authentic texts, visit:
                 if category not in collected_by_category:
                     collected_by_category[category] = []
                 collected_by_category[category].append(doc_info['title'])
-            
-            # Be respectful with timing
-            time.sleep(1)
+        
+        for job_id, reason in scheduler.failed.items():
+            logger.warning(f"Not collected: {docs_by_id.get(job_id, {}).get('title', job_id)} ({reason})")
+        if scheduler.state['pending']:
+            logger.info(f"{len(scheduler.state['pending'])} documents left for the next run (host budget)")
+        scheduler.finish()
         
         # Create collection summary
         self.create_collection_summary(collected_files, collected_by_category)
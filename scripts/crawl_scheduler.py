@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Crawl Scheduler
+Priority queue of collection jobs across hosts, polite and resumable
+"""
+
+import heapq
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.robotparser import RobotFileParser
+
+from download_engine import DEFAULT_TIMEOUT, url_host
+from download_sink import write_file_atomic
+
+# Queue for jobs without a URL: they do no network I/O and are never throttled
+LOCAL_HOST = ''
+
+class RobotsPolicy:
+    """robots.txt rules and Crawl-delay for each host, fetched once per run.
+
+    Without a session nothing is fetched and every URL is allowed. A host
+    whose robots.txt cannot be fetched is treated as allowing everything,
+    except for 401/403 answers, which disallow the whole site (the same
+    rules as urllib.robotparser).
+    """
+
+    def __init__(self, session=None, user_agent='*'):
+        self.session = session
+        self.user_agent = user_agent
+        self.parsers = {}
+        self.lock = threading.Lock()
+
+    def parser(self, url):
+        host = url_host(url)
+        with self.lock:
+            if host in self.parsers:
+                return self.parsers[host]
+
+        parser = None
+        if self.session is not None and host:
+            robots_url = f"{url.split('://', 1)[0]}://{host}/robots.txt"
+            parser = RobotFileParser(robots_url)
+            try:
+                response = self.session.get(robots_url, timeout=DEFAULT_TIMEOUT)
+                if response.status_code in (401, 403):
+                    parser.disallow_all = True
+                elif response.status_code < 400:
+                    parser.parse(response.text.splitlines())
+                else:
+                    parser.allow_all = True
+            except Exception as e:
+                print(f"  Could not fetch {robots_url}: {e.__class__.__name__}")
+                parser.allow_all = True
+
+        with self.lock:
+            return self.parsers.setdefault(host, parser)
+
+    def allowed(self, url):
+        parser = self.parser(url) if url else None
+        return parser is None or parser.can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        """Crawl-delay requested by the host's robots.txt, or None"""
+        parser = self.parser(url) if url else None
+        if parser is None:
+            return None
+        delay = parser.crawl_delay(self.user_agent)
+        if delay is None:
+            rate = parser.request_rate(self.user_agent)
+            if rate:
+                delay = rate.seconds / rate.requests
+        return float(delay) if delay is not None else None
+
+class CrawlScheduler:
+    """Runs jobs best priority first while keeping every host polite.
+
+    Each host has its own heap of jobs ordered by (priority, insertion
+    order); the scheduler always starts the best job among the hosts whose
+    crawl delay has elapsed, so a slow or rate-limited host never holds up
+    top-priority work elsewhere. At most host_budget jobs run per host in
+    one run; the rest stay queued for the next run. Jobs without a URL skip
+    robots.txt, delays and budgets and run as fast as the workers allow.
+
+    Progress is saved to state_path at most every save_interval seconds
+    and when the run ends, however it ends. Jobs already recorded as done
+    are skipped when added again, so an interrupted run resumes where it
+    stopped. finish() deletes the state once the queue is empty.
+    """
+
+    def __init__(self, state_path, robots=None, default_delay=1.0, host_budget=None,
+                 save_interval=1.0):
+        self.state_path = Path(state_path)
+        self.robots = robots or RobotsPolicy()
+        self.default_delay = default_delay
+        self.host_budget = host_budget
+        self.save_interval = save_interval
+        self.last_saved = time.monotonic()
+        self.queues = {}
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.load_state()
+
+    def load_state(self):
+        if self.state_path.exists():
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        else:
+            self.state = {'pending': {}, 'done': {}, 'failed': {}}
+
+    def save_state(self):
+        """Write the queue state (atomically)"""
+        with self.lock:
+            data = json.dumps(self.state, indent=2, ensure_ascii=False)
+        write_file_atomic(self.state_path, data)
+        self.last_saved = time.monotonic()
+
+    @property
+    def done(self):
+        return self.state['done']
+
+    @property
+    def failed(self):
+        return self.state['failed']
+
+    def retain(self, job_ids):
+        """Forget saved jobs that are not in job_ids (dropped since the last run)"""
+        job_ids = set(job_ids)
+        with self.lock:
+            for key in ('pending', 'done', 'failed'):
+                self.state[key] = {job_id: value for job_id, value in self.state[key].items()
+                                   if job_id in job_ids}
+
+    def add(self, job_id, url, priority=3, host=None):
+        """Queue a job unless a previous run already finished it"""
+        if job_id in self.state['done']:
+            return False
+        host = host or (url_host(url) if url else LOCAL_HOST)
+        heapq.heappush(self.queues.setdefault(host, []), (priority, self.sequence, job_id, url))
+        self.sequence += 1
+        self.state['pending'][job_id] = {'url': url, 'priority': priority, 'host': host}
+        self.state['failed'].pop(job_id, None)
+        return True
+
+    def host_delay(self, url):
+        delay = self.robots.crawl_delay(url)
+        return self.default_delay if delay is None else max(delay, self.default_delay)
+
+    def next_job(self, now, next_allowed, started, busy):
+        """Best job among hosts that may be contacted now, and when to look again"""
+        best = None
+        wake = None
+        for host, queue in self.queues.items():
+            if not queue:
+                continue
+            if host != LOCAL_HOST:
+                if host in busy:
+                    continue
+                if self.host_budget is not None and started.get(host, 0) >= self.host_budget:
+                    continue
+            ready_at = next_allowed.get(host, 0)
+            if ready_at > now:
+                wake = ready_at if wake is None else min(wake, ready_at)
+            elif best is None or queue[0] < self.queues[best][0]:
+                best = host
+        if best is None:
+            return None, wake
+        return (best, heapq.heappop(self.queues[best])), wake
+
+    def run(self, func, max_workers=1):
+        """Call func(job_id) for queued jobs; a truthy result marks the job done.
+
+        Returns the results of the jobs finished in this run, by job id.
+        """
+        results = {}
+        next_allowed = {}
+        started = {}
+        busy = set()
+        running = {}
+
+        def finish(future):
+            host, job_id = running.pop(future)
+            busy.discard(host)
+            try:
+                result = future.result()
+                error = None if result else 'no result'
+            except Exception as e:
+                result, error = None, f"{e.__class__.__name__}: {e}"
+            with self.lock:
+                self.state['pending'].pop(job_id, None)
+                if error:
+                    self.state['failed'][job_id] = error
+                else:
+                    self.state['done'][job_id] = result
+                    results[job_id] = result
+            if time.monotonic() - self.last_saved >= self.save_interval:
+                self.save_state()
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while True:
+                    job = None
+                    wake = None
+                    if len(running) < max_workers:
+                        job, wake = self.next_job(time.monotonic(), next_allowed, started, busy)
+
+                    if job is not None:
+                        host, (priority, _, job_id, url) = job
+                        if url and not self.robots.allowed(url):
+                            with self.lock:
+                                self.state['pending'].pop(job_id, None)
+                                self.state['failed'][job_id] = 'disallowed by robots.txt'
+                            continue
+                        if host != LOCAL_HOST:
+                            started[host] = started.get(host, 0) + 1
+                            next_allowed[host] = time.monotonic() + self.host_delay(url)
+                            # One request in flight per host; the delay runs from its start
+                            busy.add(host)
+                        running[executor.submit(func, job_id)] = (host, job_id)
+                        continue
+
+                    if not running and wake is None:
+                        break
+                    timeout = max(0.0, wake - time.monotonic()) if wake is not None else None
+                    if not running:
+                        time.sleep(timeout)
+                        continue
+                    finished, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(future)
+        finally:
+            self.save_state()
+
+        return results
+
+    def finish(self):
+        """Forget the saved state once nothing is left to do"""
+        if not self.state['pending'] and not self.state['failed'] and self.state_path.exists():
+            self.state_path.unlink()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Shared SQLite Connection Factory
+Opens the Bahai documents database for building or for read-only serving
+"""
+
+import os
+import sqlite3
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+# Default memory map window for finalized assets (256 MiB covers the whole
+# shipped database, so page reads become plain memory accesses)
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+
+def database_uri(db_path, read_only=True, immutable=True):
+    """Build a file: URI for the database at db_path"""
+    path = quote(Path(db_path).resolve().as_posix())
+    params = []
+    if read_only:
+        params.append('mode=ro')
+    if immutable:
+        # The file will not change underneath us: skip locking and change checks
+        params.append('immutable=1')
+    uri = f"file:{path}"
+    if params:
+        uri += '?' + '&'.join(params)
+    return uri
+
+def connect(db_path, read_only=False, immutable=None, mmap_size=DEFAULT_MMAP_SIZE):
+    """Open a connection to the documents database.
+
+    Writable connections behave like a plain sqlite3.connect(). Read-only
+    connections are meant for finalized assets: they open through a
+    mode=ro URI (immutable unless told otherwise), map the file into memory
+    and turn off journaling, which a reader never needs.
+    """
+    if not read_only:
+        return sqlite3.connect(db_path)
+
+    if immutable is None:
+        immutable = True
+
+    db_path = Path(db_path)
+    if not db_path.exists():
+        # mode=ro would otherwise report the far less helpful "unable to open"
+        raise FileNotFoundError(f"Database not found: {db_path}")
+
+    conn = sqlite3.connect(database_uri(db_path, read_only=True, immutable=immutable), uri=True)
+    if mmap_size:
+        conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+def seed_build_database(db_path, build_path):
+    """Start a build file next to the live database.
+
+    Any stale build left by a crashed run is discarded. When a live database
+    exists its contents are copied in through the backup API, so incremental
+    builds see everything that was already indexed. Pass db_path=None to
+    start from an empty database.
+    """
+    build_path = Path(build_path)
+    if build_path.exists():
+        build_path.unlink()
+
+    if db_path is not None and Path(db_path).exists():
+        source = connect(db_path, read_only=True, immutable=False)
+        target = sqlite3.connect(build_path)
+        source.backup(target)
+        target.close()
+        source.close()
+
+def publish_database(build_path, db_path, retries=5, keep_build=False):
+    """Finalize a build and atomically swap it in as the live database.
+
+    The build is compacted into a temporary file in the same directory,
+    flushed to disk and renamed over db_path. Readers holding the previous
+    file keep a consistent view until they reopen. The build file is removed
+    unless keep_build is set.
+    """
+    build_path = Path(build_path)
+    db_path = Path(db_path)
+    temp_path = db_path.with_name(f".{db_path.name}.{os.getpid()}.tmp")
+    if temp_path.exists():
+        temp_path.unlink()
+
+    try:
+        conn = sqlite3.connect(build_path)
+        conn.execute("VACUUM INTO ?", (str(temp_path),))
+        conn.close()
+
+        with open(temp_path, 'rb+') as f:
+            os.fsync(f.fileno())
+
+        for attempt in range(retries):
+            try:
+                os.replace(temp_path, db_path)
+                break
+            except PermissionError:
+                # Windows refuses to replace a file another process has open
+                if attempt == retries - 1:
+                    raise
+                time.sleep(0.2 * (attempt + 1))
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+    if hasattr(os, 'O_DIRECTORY'):
+        # Persist the rename itself
+        dir_fd = os.open(db_path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    if not keep_build:
+        build_path.unlink()
@@ -13,6 +13,12 @@ from pathlib import Path
 import time
 import hashlib
 
+from download_engine import ConcurrentDownloadEngine, DEFAULT_TIMEOUT, shared_resilience, url_host
+from download_sink import ResumableFileSink
+from document_store import ContentStore
+from metadata_store import MetadataStore
+from instrumentation import span
+
 class BahaiDocumentDownloader:
     def __init__(self, base_dir="documents"):
         self.base_dir = Path(base_dir)
@@ -31,7 +37,10 @@ class BahaiDocumentDownloader:
             'universalhouseofjustice.bahai.org': self.confirmed_dir
         }
         
-        # Document metadata tracking
+        # Shared content-addressed store; document paths link into it
+        self.store = ContentStore(self.base_dir / ".store")
+        
+        # Document metadata tracking (shared by concurrent download workers)
         self.metadata_file = self.base_dir / "document_metadata.json"
         self.load_metadata()
         
@@ -40,24 +49,29 @@ class BahaiDocumentDownloader:
         self.session.headers.update({
             'User-Agent': 'Bahai Resource Library Document Downloader 0.2.0'
         })
+        
+        # Retries with backoff, and a circuit breaker shared by all downloaders
+        self.resilience = shared_resilience()
+        
+        # Per-host rate limiter of the running download engine; retries wait on it too
+        self.limiter = None
 
     def load_metadata(self):
-        """Load existing document metadata"""
-        if self.metadata_file.exists():
-            with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                self.metadata = json.load(f)
-        else:
-            self.metadata = {
-                'documents': {},
-                'last_updated': None,
-                'sources': list(self.official_sources.keys())
-            }
+        """Open the metadata store, importing document_metadata.json if newer"""
+        self.metadata_store = MetadataStore(self.base_dir / "document_metadata.db",
+                                            self.metadata_file)
+        if self.metadata_store.get_info('sources') is None:
+            self.metadata_store.set_info('last_updated', None)
+            self.metadata_store.set_info('sources', list(self.official_sources.keys()))
     
     def save_metadata(self):
-        """Save document metadata to file"""
-        self.metadata['last_updated'] = time.strftime('%Y-%m-%d %H:%M:%S')
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, indent=2, ensure_ascii=False)
+        """Export the metadata store to document_metadata.json.
+        
+        Entries are already committed as each download finishes; this only
+        refreshes the JSON catalog read by other tools.
+        """
+        self.metadata_store.set_info('last_updated', time.strftime('%Y-%m-%d %H:%M:%S'))
+        self.metadata_store.export_json()
     
     def get_file_hash(self, filepath):
         """Calculate SHA-256 hash of file"""
@@ -67,43 +81,71 @@ class BahaiDocumentDownloader:
                 hash_sha256.update(chunk)
         return hash_sha256.hexdigest()
     
+    def target_path(self, url, title, author):
+        """Where a document from url is stored"""
+        # Determine target directory based on source
+        target_dir = self.official_sources.get(urlparse(url).netloc, self.pending_dir)
+        
+        # Create filename
+        safe_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
+        safe_author = re.sub(r'[^\w\s-]', '', author).strip().replace(' ', '_')
+        return target_dir / f"{safe_author}_{safe_title}.pdf"
+    
     def download_document(self, url, title, author, category, description=""):
         """Download a single document"""
         try:
             print(f"Downloading: {title} by {author}")
             
-            # Determine target directory based on source
             parsed_url = urlparse(url)
-            target_dir = self.official_sources.get(parsed_url.netloc, self.pending_dir)
+            filepath = self.target_path(url, title, author)
+            filename = filepath.name
             
-            # Create filename
-            safe_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
-            safe_author = re.sub(r'[^\w\s-]', '', author).strip().replace(' ', '_')
-            filename = f"{safe_author}_{safe_title}.pdf"
-            filepath = target_dir / filename
-            
-            # Skip if already downloaded and hash matches
-            if filepath.exists() and url in self.metadata['documents']:
-                stored_hash = self.metadata['documents'][url].get('hash')
-                current_hash = self.get_file_hash(filepath)
-                if stored_hash == current_hash:
+            # Revalidate a previous download with the server instead of
+            # re-hashing it: an unchanged document costs a 304 and no disk I/O
+            stored = self.metadata_store.get(url)
+            conditional_headers = {}
+            if filepath.exists() and stored:
+                if stored.get('etag') or stored.get('last_modified'):
+                    if filepath.stat().st_size == stored.get('size'):
+                        if stored.get('etag'):
+                            conditional_headers['If-None-Match'] = stored['etag']
+                        if stored.get('last_modified'):
+                            conditional_headers['If-Modified-Since'] = stored['last_modified']
+                elif stored.get('hash') == self.get_file_hash(filepath):
+                    # Entries recorded before validators were stored
                     print(f"  Already downloaded: {filename}")
                     return filepath
             
-            # Download the file
-            response = self.session.get(url, stream=True, timeout=30)
-            response.raise_for_status()
+            # Download the file, hashing it as it streams in. An interrupted
+            # transfer keeps its partial file, so a retry resumes from there.
+            def fetch():
+                with ResumableFileSink(filepath, url, store=self.store) as sink:
+                    headers = sink.request_headers()
+                    if not sink.size:
+                        headers.update(conditional_headers)
+                    
+                    response = self.session.get(url, stream=True, timeout=DEFAULT_TIMEOUT,
+                                                headers=headers)
+                    if response.status_code == 304:
+                        response.close()
+                        return None
+                    
+                    sink.start(response)
+                    sink.write_response(response)
+                    sink.commit()
+                    return sink
             
-            # Save file
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            with span('download', 'download', url=url):
+                sink = self.resilience.call(url, fetch, self.limiter)
+            if sink is None:
+                print(f"  Not modified: {filename}")
+                return filepath
             
-            # Calculate hash and store metadata
-            file_hash = self.get_file_hash(filepath)
-            file_size = filepath.stat().st_size
+            # Store metadata
+            file_hash = sink.hexdigest
+            file_size = sink.size
             
-            self.metadata['documents'][url] = {
+            entry = {
                 'title': title,
                 'author': author,
                 'category': category,
@@ -113,8 +155,11 @@ class BahaiDocumentDownloader:
                 'hash': file_hash,
                 'size': file_size,
                 'downloaded': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'source': parsed_url.netloc
+                'source': parsed_url.netloc,
+                'etag': sink.etag,
+                'last_modified': sink.last_modified
             }
+            self.metadata_store.put(url, entry)
             
             print(f"  Downloaded: {filename} ({file_size / 1024:.1f} KB)")
             return filepath
@@ -123,8 +168,8 @@ class BahaiDocumentDownloader:
             print(f"  Error downloading {title}: {e}")
             return None
     
-    def download_essential_texts(self):
-        """Download core essential Bahai texts"""
+    def essential_documents(self):
+        """Core essential Bahai texts"""
         
         # Note: These are sample documents. In practice, we'll look for available PDFs
         # from official Bahai websites and download them programmatically
@@ -209,25 +254,37 @@ class BahaiDocumentDownloader:
                 'description': 'Collection of Baha\'i prayers and devotional writings'
             }
         ]
+        return essential_documents
+    
+    def download_essential_texts(self, max_workers=4, rate_per_host=1.0):
+        """Download core essential Bahai texts.
         
+        Downloads run concurrently, limited to max_workers at a time and to
+        rate_per_host requests per second against any single host.
+        """
+        essential_documents = self.essential_documents()
         print(f"Downloading {len(essential_documents)} essential Baha'i texts...")
-        downloaded_count = 0
         
-        for doc in essential_documents:
-            if self.download_document(**doc):
-                downloaded_count += 1
-            time.sleep(1)  # Be respectful to servers
+        # Be respectful to servers: each host gets its own request budget
+        engine = ConcurrentDownloadEngine(max_workers=max_workers, rate_per_host=rate_per_host)
+        self.limiter = engine.limiter
+        results = engine.run(lambda doc: self.download_document(**doc),
+                             essential_documents,
+                             host_of=lambda doc: url_host(doc['url']))
+        downloaded_count = sum(1 for result in results if result)
         
         print(f"\nDownload Summary:")
         print(f"  Successfully downloaded: {downloaded_count}/{len(essential_documents)} documents")
         print(f"  Files stored in: {self.confirmed_dir}")
         
         self.save_metadata()
+        self.store.save()
         return downloaded_count
     
     def generate_download_report(self):
         """Generate a report of downloaded documents"""
-        if not self.metadata['documents']:
+        documents = self.metadata_store.items()
+        if not documents:
             print("No documents downloaded yet.")
             return
         
@@ -236,11 +293,11 @@ class BahaiDocumentDownloader:
             f.write("BAHAI RESOURCE LIBRARY - DOCUMENT DOWNLOAD REPORT\n")
             f.write("=" * 60 + "\n\n")
             f.write(f"Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Total Documents: {len(self.metadata['documents'])}\n\n")
+            f.write(f"Total Documents: {len(documents)}\n\n")
             
             # Group by author
             by_author = {}
-            for url, doc in self.metadata['documents'].items():
+            for url, doc in documents:
                 author = doc['author']
                 if author not in by_author:
                     by_author[author] = []
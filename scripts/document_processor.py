@@ -4,14 +4,24 @@ Bahai Document Processor
 Extracts text from PDFs and creates searchable index for Android app
 """
 
+import io
 import os
 import json
-import sqlite3
 import hashlib
 import re
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 import argparse
+import threading
+import time
+from contextlib import contextmanager
+
+from db_connection import connect, seed_build_database, publish_database
+from document_store import ContentStore
+from instrumentation import add_arguments as add_instrumentation_arguments
+from instrumentation import configure_from_args, finish as finish_instrumentation, span
+from metadata_store import MetadataStore
+from text_normalizer import clean_text, iter_blocks, iter_lines, mapped_lines
 
 try:
     import PyPDF2
@@ -25,9 +35,116 @@ try:
 except ImportError:
     HAS_PDFPLUMBER = False
 
+def resolve_build_timestamp(value=None):
+    """Resolve the timestamp stamped into a build.
+
+    Accepts an ISO-8601 string or a Unix epoch. When no value is given the
+    SOURCE_DATE_EPOCH environment variable is honoured, falling back to the
+    Unix epoch so that reproducible builds never depend on the wall clock.
+    """
+    if value is None:
+        value = os.environ.get('SOURCE_DATE_EPOCH', '0')
+    value = str(value).strip()
+    if value.isdigit():
+        return datetime.fromtimestamp(int(value), tz=timezone.utc).replace(tzinfo=None).isoformat()
+    return datetime.fromisoformat(value).isoformat()
+
+# Bump when a change to extraction or the schema makes existing indexes stale
+PROCESSOR_VERSION = 2
+
+# Common Bahai-specific terms to prioritize in search term extraction
+BAHAI_TERMS = frozenset({
+    'bahaullah', 'abdul-baha', 'shoghi', 'effendi', 'universal', 'house', 'justice',
+    'kitab', 'aqdas', 'iqan', 'gleanings', 'manifestation', 'covenant', 'administrative',
+    'spiritual', 'assembly', 'guardian', 'guidance', 'revelation', 'dispensation',
+    'bahai', 'faith', 'unity', 'diversity', 'peace', 'justice', 'love', 'service'
+})
+
+# Precompiled tokenizer patterns, shared across documents
+WORD_PATTERNS = {}
+
+def word_pattern(min_length):
+    """Compiled word tokenizer for the given minimum word length"""
+    pattern = WORD_PATTERNS.get(min_length)
+    if pattern is None:
+        pattern = re.compile(r'\b[a-zA-Z]{' + str(min_length) + r',}\b')
+        WORD_PATTERNS[min_length] = pattern
+    return pattern
+
+class ProcessingStats:
+    """Running counters for one processing run.
+    
+    Stages update the counters as they go, so reports never have to
+    re-scan the database to find out what a run did.
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.documents_processed = 0
+        self.documents_skipped = 0
+        self.documents_failed = 0
+        self.documents_removed = 0
+        self.pages = 0
+        self.words = 0
+        self.bytes = 0
+        self.search_terms_written = 0
+        self.stage_seconds = {}
+        self.failures = {}
+        self.lock = threading.Lock()
+    
+    @contextmanager
+    def timer(self, stage):
+        """Accumulate the wall time spent in a stage (also traced as a span)"""
+        start = time.perf_counter()
+        try:
+            with span(stage, 'processor'):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + elapsed
+    
+    def record_failure(self, reason):
+        with self.lock:
+            self.documents_failed += 1
+            self.failures[reason] = self.failures.get(reason, 0) + 1
+    
+    def to_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'documents_processed': self.documents_processed,
+            'documents_skipped': self.documents_skipped,
+            'documents_failed': self.documents_failed,
+            'documents_removed': self.documents_removed,
+            'pages': self.pages,
+            'words': self.words,
+            'bytes': self.bytes,
+            'search_terms_written': self.search_terms_written,
+            'elapsed_seconds': round(elapsed, 6),
+            'stage_seconds': {stage: round(seconds, 6)
+                              for stage, seconds in sorted(self.stage_seconds.items())},
+            'failures': dict(sorted(self.failures.items())),
+            'throughput': {
+                'documents_per_second': round(self.documents_processed / elapsed, 3) if elapsed else 0,
+                'bytes_per_second': round(self.bytes / elapsed, 1) if elapsed else 0
+            }
+        }
+
 class BahaiDocumentProcessor:
-    def __init__(self, documents_dir="documents"):
+    def __init__(self, documents_dir="documents", reproducible=False, build_timestamp=None,
+                 rebuild=False):
         self.documents_dir = Path(documents_dir)
+        
+        # A rebuild indexes every document again into an empty database
+        self.rebuild = rebuild
+        
+        # Reproducible builds use sorted inputs, a fixed timestamp and a fresh
+        # database so that identical inputs yield a byte-identical asset
+        self.reproducible = reproducible
+        if reproducible or build_timestamp is not None:
+            self.build_timestamp = resolve_build_timestamp(build_timestamp)
+        else:
+            self.build_timestamp = None
         self.confirmed_dir = self.documents_dir / "confirmed-official"
         self.pending_dir = self.documents_dir / "pending-permissions"
         
@@ -37,31 +154,83 @@ class BahaiDocumentProcessor:
         
         # Database for search indexing
         self.db_path = self.output_dir / "bahai_documents.db"
+        self.hash_path = self.db_path.with_name(self.db_path.name + ".sha256")
+        
+        # Builds go to a separate file that is swapped in atomically when
+        # finished, so readers never see a half-built index
+        self.build_path = self.db_path.with_name(self.db_path.name + ".building")
         
         # Text extraction output
         self.text_dir = Path("processed_text")
         self.text_dir.mkdir(exist_ok=True)
         
+        # Content store shared with the downloaders: linked documents have
+        # known hashes and need not be read just to be hashed
+        self.store = ContentStore(self.documents_dir / ".store")
+        
         # Load metadata
         self.metadata_file = self.documents_dir / "document_metadata.json"
+        self.metadata_store_path = self.documents_dir / "document_metadata.db"
+        # Every file metadata is read from (the store commits into its WAL first)
+        self.metadata_files = {self.metadata_file, self.metadata_store_path,
+                               self.metadata_store_path.with_name(self.metadata_store_path.name + "-wal")}
+        self.metadata_store = None
         self.load_metadata()
         
+        # Connection to the build database, kept open for the whole run
+        self.conn = None
+        
+        # Counters for the current run, plus running totals for the whole
+        # index (id -> (author, pages, words) and the set of search terms)
+        self.stats = ProcessingStats()
+        self.index_documents = {}
+        self.index_terms = set()
+        
         # Initialize database
         self.init_database()
     
     def load_metadata(self):
         """Load document metadata"""
+        if self.metadata_store_path.exists():
+            # Indexed lookups in the downloader's metadata store
+            if self.metadata_store is not None:
+                self.metadata_store.close()
+            self.metadata_store = MetadataStore(self.metadata_store_path, self.metadata_file)
+            return
+        
         if self.metadata_file.exists():
             with open(self.metadata_file, 'r', encoding='utf-8') as f:
                 self.metadata = json.load(f)
         else:
             self.metadata = {'documents': {}}
             print("Warning: No metadata file found. Run document_downloader.py first.")
+        
+        # Index metadata by filename once instead of scanning it per document.
+        # The first entry wins, as with the previous linear search.
+        self.metadata_by_name = {}
+        for url, meta in self.metadata.get('documents', {}).items():
+            name = Path(meta.get('filepath', '').replace('\\', '/')).name
+            self.metadata_by_name.setdefault(name, meta)
+    
+    def find_metadata(self, file_path):
+        """Metadata entry for a document file, matched by filename"""
+        if self.metadata_store is not None:
+            return self.metadata_store.by_filename(file_path.name)
+        return self.metadata_by_name.get(file_path.name)
+    
+    def timestamp(self):
+        """Return the build timestamp, or the current time for regular builds"""
+        return self.build_timestamp or datetime.now().isoformat()
     
     def init_database(self):
         """Initialize SQLite database with FTS5 for full-text search"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Reproducible builds start from an empty file so rowids follow the
+        # sorted input order; regular builds extend a copy of the live index
+        seed_build_database(None if self.reproducible or self.rebuild else self.db_path,
+                            self.build_path)
+        
+        self.conn = connect(self.build_path)
+        cursor = self.conn.cursor()
         
         # Create documents table
         cursor.execute('''
@@ -127,9 +296,17 @@ class BahaiDocumentProcessor:
             )
         ''')
         
-        conn.commit()
-        conn.close()
-        print(f"Database initialized: {self.db_path}")
+        self.conn.commit()
+        
+        # Load the running totals once; from here on they are kept up to date
+        # as documents are added and removed
+        cursor.execute("SELECT id, author, page_count, word_count FROM documents")
+        self.index_documents = {row[0]: (row[1], row[2] or 0, row[3] or 0)
+                                for row in cursor.fetchall()}
+        cursor.execute("SELECT term FROM search_terms")
+        self.index_terms = {row[0] for row in cursor.fetchall()}
+        
+        print(f"Database initialized: {self.build_path}")
     
     def extract_text_from_file(self, file_path):
         """Extract text from file (PDF or text)"""
@@ -138,23 +315,8 @@ class BahaiDocumentProcessor:
         if file_extension == '.txt':
             # Handle text files
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    
-                # Split into pages (for text files, we'll treat each paragraph as a "page")
-                paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-                text_pages = []
-                
-                for page_num, paragraph in enumerate(paragraphs, 1):
-                    text = self.clean_text(paragraph)
-                    if text:  # Only add non-empty pages
-                        text_pages.append({
-                            'page': page_num,
-                            'text': text,
-                            'word_count': len(text.split())
-                        })
-                
-                return text_pages
+                with mapped_lines(file_path) as lines:
+                    return self.split_text_pages(lines)
                 
             except Exception as e:
                 print(f"Error reading text file {file_path}: {e}")
@@ -167,14 +329,45 @@ class BahaiDocumentProcessor:
         else:
             print(f"Unsupported file type: {file_extension}")
             return []
-        """Extract text from PDF using available libraries"""
+    
+    def extract_text_from_bytes(self, data, file_extension):
+        """Extract text from an in-memory document (PDF or text)"""
+        if file_extension == '.txt':
+            return self.split_text_pages(iter_lines(data, errors='replace'))
+        elif file_extension == '.pdf':
+            return self.extract_text_from_pdf(io.BytesIO(data))
+        else:
+            print(f"Unsupported file type: {file_extension}")
+            return []
+    
+    def split_text_pages(self, content):
+        """Split plain text (a string or lines) into pages (each paragraph is treated as a "page")"""
+        if isinstance(content, str):
+            content = iter_lines(content)
+        text_pages = []
+        
+        # One span per document: a span per paragraph would flood the trace
+        with span('normalize', 'processor'):
+            for page_num, block in enumerate(iter_blocks(content), 1):
+                text = self.clean_text("\n".join(block))
+                if text:  # Only add non-empty pages
+                    text_pages.append({
+                        'page': page_num,
+                        'text': text,
+                        'word_count': len(text.split())
+                    })
+        
+        return text_pages
+    
+    def extract_text_from_pdf(self, source):
+        """Extract text from a PDF (a path or a binary file object) using available libraries"""
         text_pages = []
         
         try:
             # Try pdfplumber first (usually better text extraction)
             if HAS_PDFPLUMBER:
                 import pdfplumber
-                with pdfplumber.open(pdf_path) as pdf:
+                with pdfplumber.open(source) as pdf:
                     for page_num, page in enumerate(pdf.pages, 1):
                         text = page.extract_text() or ""
                         text = self.clean_text(text)
@@ -186,81 +379,50 @@ class BahaiDocumentProcessor:
                         
             # Fallback to PyPDF2
             elif HAS_PYPDF2:
-                with open(pdf_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    for page_num, page in enumerate(pdf_reader.pages, 1):
-                        text = page.extract_text() or ""
-                        text = self.clean_text(text)
-                        text_pages.append({
-                            'page': page_num,
-                            'text': text,
-                            'word_count': len(text.split())
-                        })
+                # Accepts a path or a file-like object, like pdfplumber.open
+                pdf_reader = PyPDF2.PdfReader(source)
+                for page_num, page in enumerate(pdf_reader.pages, 1):
+                    text = page.extract_text() or ""
+                    text = self.clean_text(text)
+                    text_pages.append({
+                        'page': page_num,
+                        'text': text,
+                        'word_count': len(text.split())
+                    })
             else:
                 print("Warning: No PDF processing libraries available.")
                 print("Install: pip install pdfplumber PyPDF2")
                 return []
                 
         except Exception as e:
-            print(f"Error extracting text from {pdf_path}: {e}")
+            print(f"Error extracting text from {getattr(source, 'name', source)}: {e}")
             return []
         
         return text_pages
     
     def clean_text(self, text):
         """Clean and normalize extracted text"""
-        if not text:
-            return ""
-        
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove page headers/footers (basic heuristics)
-        lines = text.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            # Skip likely headers/footers
-            if len(line) < 3:
-                continue
-            if re.match(r'^\d+$', line):  # Skip page numbers
-                continue
-            if 'www.' in line.lower() or 'http' in line.lower():  # Skip URLs
-                continue
-            cleaned_lines.append(line)
-        
-        text = '\n'.join(cleaned_lines)
-        text = text.strip()
-        
-        return text
+        return clean_text(text)
     
     def extract_search_terms(self, text, min_length=3, max_terms=100):
         """Extract important search terms from text"""
-        # Common Bahai-specific terms to prioritize
-        bahai_terms = {
-            'bahaullah', 'abdul-baha', 'shoghi', 'effendi', 'universal', 'house', 'justice',
-            'kitab', 'aqdas', 'iqan', 'gleanings', 'manifestation', 'covenant', 'administrative',
-            'spiritual', 'assembly', 'guardian', 'guidance', 'revelation', 'dispensation',
-            'bahai', 'faith', 'unity', 'diversity', 'peace', 'justice', 'love', 'service'
-        }
-        
-        # Extract words
-        words = re.findall(r'\b[a-zA-Z]{' + str(min_length) + ',}\b', text.lower())
-        
-        # Count frequency
-        word_freq = {}
-        for word in words:
-            word_freq[word] = word_freq.get(word, 0) + 1
-        
-        # Prioritize Bahai-specific terms
-        for term in bahai_terms:
-            if term in word_freq:
-                word_freq[term] *= 3  # Boost Bahai-specific terms
-        
-        # Sort by frequency and return top terms
-        sorted_terms = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-        return sorted_terms[:max_terms]
+        with span('tokenize', 'processor'):
+            # Extract words
+            words = word_pattern(min_length).findall(text.lower())
+            
+            # Count frequency
+            word_freq = {}
+            for word in words:
+                word_freq[word] = word_freq.get(word, 0) + 1
+            
+            # Prioritize Bahai-specific terms
+            for term in BAHAI_TERMS:
+                if term in word_freq:
+                    word_freq[term] *= 3  # Boost Bahai-specific terms
+            
+            # Sort by frequency and return top terms
+            sorted_terms = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
+            return sorted_terms[:max_terms]
     
     def process_document(self, file_path):
         """Process a single PDF document"""
@@ -268,25 +430,21 @@ class BahaiDocumentProcessor:
             print(f"Processing: {file_path.name}")
             
             # Calculate file hash
-            file_hash = self.calculate_file_hash(file_path)
+            with self.stats.timer('hash'):
+                file_hash = self.store.digest_for(file_path) or self.calculate_file_hash(file_path)
             
             # Check if already processed
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self.conn.cursor()
             cursor.execute("SELECT id FROM documents WHERE file_hash = ?", (file_hash,))
             existing = cursor.fetchone()
             
             if existing:
                 print(f"  Already processed: {file_path.name}")
-                conn.close()
+                self.stats.documents_skipped += 1
                 return existing[0]
             
             # Find metadata for this file
-            doc_meta = None
-            for url, meta in self.metadata.get('documents', {}).items():
-                if Path(meta.get('filepath', '')).name == file_path.name:
-                    doc_meta = meta
-                    break
+            doc_meta = self.find_metadata(file_path)
             
             if not doc_meta:
                 print(f"  Warning: No metadata found for {file_path.name}")
@@ -299,17 +457,41 @@ class BahaiDocumentProcessor:
                 }
             
             # Extract text from file (PDF or text)
-            text_pages = self.extract_text_from_file(file_path)
+            with self.stats.timer('extract'):
+                text_pages = self.extract_text_from_file(file_path)
             
             if not text_pages:
                 print(f"  Failed to extract text from {file_path.name}")
-                conn.close()
+                self.stats.record_failure('no_text_extracted')
                 return None
             
-            # Calculate totals
-            total_words = sum(page['word_count'] for page in text_pages)
-            page_count = len(text_pages)
+            return self.index_document(file_path, file_hash, doc_meta, text_pages,
+                                       file_path.stat().st_size)
             
+        except Exception as e:
+            self.conn.rollback()
+            self.stats.record_failure(type(e).__name__)
+            print(f"Error processing {file_path}: {e}")
+            return None
+    
+    def indexed_hashes(self):
+        """Hashes of every document already in the build database"""
+        return {row[0] for row in self.conn.execute("SELECT file_hash FROM documents")}
+    
+    def index_document(self, file_path, file_hash, doc_meta, text_pages, size):
+        """Insert an extracted document into the build database.
+        
+        file_path is where the document lives (or would live) under the
+        documents directory; the file itself is never read here, so
+        documents can be indexed straight from memory.
+        """
+        cursor = self.conn.cursor()
+        
+        # Calculate totals
+        total_words = sum(page['word_count'] for page in text_pages)
+        page_count = len(text_pages)
+        
+        with self.stats.timer('insert'):
             # Insert document record
             cursor.execute('''
                 INSERT INTO documents 
@@ -321,11 +503,11 @@ class BahaiDocumentProcessor:
                 doc_meta['author'], 
                 doc_meta['category'],
                 doc_meta.get('description', ''),
-                str(file_path.relative_to(self.documents_dir)),
+                self.relative_path(file_path),
                 file_hash,
                 page_count,
                 total_words,
-                datetime.now().isoformat(),
+                self.timestamp(),
                 doc_meta.get('url', '')
             ))
             
@@ -344,7 +526,7 @@ class BahaiDocumentProcessor:
                     page_data['text'],
                     page_data['word_count']
                 ))
-                
+            
                 full_text_parts.append(page_data['text'])
             
             # Insert into FTS table
@@ -359,19 +541,21 @@ class BahaiDocumentProcessor:
                 full_text,
                 doc_meta['category']
             ))
-            
-            # Extract and store search terms
+        
+        # Extract and store search terms
+        with self.stats.timer('search_terms'):
             search_terms = self.extract_search_terms(full_text)
             for term, frequency in search_terms:
                 cursor.execute('''
                     INSERT OR REPLACE INTO search_terms (term, frequency, category)
                     VALUES (?, ?, ?)
                 ''', (term, frequency, doc_meta['category']))
-            
-            conn.commit()
-            conn.close()
-            
-            # Save extracted text to file for backup
+        
+        with self.stats.timer('commit'):
+            self.conn.commit()
+        
+        # Save extracted text to file for backup
+        with self.stats.timer('text_backup'):
             text_file = self.text_dir / f"{file_path.stem}.txt"
             with open(text_file, 'w', encoding='utf-8') as f:
                 f.write(f"Title: {doc_meta['title']}\n")
@@ -381,13 +565,39 @@ class BahaiDocumentProcessor:
                 f.write(f"Words: {total_words}\n")
                 f.write("=" * 60 + "\n\n")
                 f.write(full_text)
-            
-            print(f"  Extracted: {page_count} pages, {total_words} words")
-            return document_id
-            
-        except Exception as e:
-            print(f"Error processing {file_path}: {e}")
-            return None
+        
+        self.stats.documents_processed += 1
+        self.stats.pages += page_count
+        self.stats.words += total_words
+        self.stats.bytes += size
+        self.stats.search_terms_written += len(search_terms)
+        self.index_documents[document_id] = (doc_meta['author'], page_count, total_words)
+        self.index_terms.update(term for term, frequency in search_terms)
+        
+        print(f"  Extracted: {page_count} pages, {total_words} words")
+        return document_id
+    
+    def remove_document(self, file_path):
+        """Remove every indexed copy of a document so it can be re-indexed"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id FROM documents WHERE file_path = ?",
+                       (self.relative_path(file_path),))
+        document_ids = [row[0] for row in cursor.fetchall()]
+        
+        for document_id in document_ids:
+            cursor.execute("DELETE FROM pages WHERE document_id = ?", (document_id,))
+            cursor.execute("DELETE FROM document_search WHERE rowid = ?", (document_id,))
+            cursor.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+            self.index_documents.pop(document_id, None)
+        
+        self.conn.commit()
+        return len(document_ids)
+    
+    def relative_path(self, file_path):
+        """Path of a document relative to the documents directory"""
+        relative = file_path.relative_to(self.documents_dir)
+        # Reproducible builds must not depend on the host's path separator
+        return relative.as_posix() if self.reproducible else str(relative)
     
     def calculate_file_hash(self, file_path):
         """Calculate SHA-256 hash of file"""
@@ -397,17 +607,21 @@ class BahaiDocumentProcessor:
                 hash_sha256.update(chunk)
         return hash_sha256.hexdigest()
     
-    def process_all_documents(self):
-        """Process all documents in the documents directory"""
+    def find_input_files(self):
+        """Find all text and PDF files, text files first"""
         text_files = []
         pdf_files = []
         
-        # Find all text and PDF files
         for directory in [self.confirmed_dir, self.pending_dir]:
             if directory.exists():
-                text_files.extend(directory.glob("*.txt"))
-                pdf_files.extend(directory.glob("*.pdf"))
+                text_files.extend(sorted(directory.glob("*.txt")))
+                pdf_files.extend(sorted(directory.glob("*.pdf")))
         
+        return text_files, pdf_files
+    
+    def process_all_documents(self, keep_build=False):
+        """Process all documents in the documents directory"""
+        text_files, pdf_files = self.find_input_files()
         all_files = text_files + pdf_files
         
         if not all_files:
@@ -416,12 +630,14 @@ class BahaiDocumentProcessor:
             return
         
         print(f"Found {len(text_files)} text files and {len(pdf_files)} PDF files to process")
+        self.stats = ProcessingStats()
         
         processed_count = 0
         failed_count = 0
         
         for file in all_files:
-            result = self.process_document(file)
+            with span('document', 'processor', file=file.name):
+                result = self.process_document(file)
             if result:
                 processed_count += 1
             else:
@@ -432,43 +648,148 @@ class BahaiDocumentProcessor:
         print(f"  Failed: {failed_count}")
         print(f"  Database: {self.db_path}")
         
+        self.publish(keep_build=keep_build)
         self.generate_processing_report()
     
-    def generate_processing_report(self):
-        """Generate a report of processed documents"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Get summary statistics
-        cursor.execute("SELECT COUNT(*) FROM documents")
-        doc_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT SUM(page_count) FROM documents") 
-        total_pages = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT SUM(word_count) FROM documents")
-        total_words = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT COUNT(*) FROM search_terms")
-        term_count = cursor.fetchone()[0]
-        
-        # Get documents by author
-        cursor.execute('''
-            SELECT author, COUNT(*), SUM(page_count), SUM(word_count)
-            FROM documents 
-            GROUP BY author 
-            ORDER BY COUNT(*) DESC
-        ''')
-        by_author = cursor.fetchall()
+    def snapshot_inputs(self):
+        """Modification time and size of every input file and the metadata"""
+        text_files, pdf_files = self.find_input_files()
+        snapshot = {}
+        for file_path in text_files + pdf_files + sorted(self.metadata_files):
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+    
+    def reindex(self, changed, removed, keep_build=True):
+        """Re-index changed files, drop removed ones and publish the result"""
+        if (changed | removed) & self.metadata_files:
+            # Titles and authors may have changed for any document
+            self.load_metadata()
+            text_files, pdf_files = self.find_input_files()
+            changed = set(text_files + pdf_files)
+        
+        self.stats = ProcessingStats()
+        for file_path in sorted(removed - self.metadata_files):
+            print(f"Removed: {file_path.name}")
+            self.stats.documents_removed += self.remove_document(file_path)
+        
+        for file_path in sorted(changed - self.metadata_files):
+            with span('document', 'processor', file=file_path.name):
+                self.remove_document(file_path)
+                self.process_document(file_path)
+        
+        self.publish(keep_build=keep_build)
+        self.generate_processing_report()
+    
+    def watch(self, interval=1.0, debounce=2.0):
+        """Watch the documents directory and re-index changes as they land.
+        
+        The directory is polled every interval seconds. Changes are collected
+        until nothing has changed for debounce seconds, then the affected
+        documents are re-indexed in one batch. The build connection, metadata
+        index and tokenizer tables stay warm between batches.
+        """
+        self.process_all_documents(keep_build=True)
+        print(f"\nWatching {self.documents_dir} for changes (Ctrl+C to stop)...")
+        
+        known = self.snapshot_inputs()
+        pending_changed = set()
+        pending_removed = set()
+        last_change = None
         
-        conn.close()
+        try:
+            while True:
+                time.sleep(interval)
+                
+                current = self.snapshot_inputs()
+                changed = {path for path, signature in current.items()
+                           if known.get(path) != signature}
+                removed = set(known) - set(current)
+                known = current
+                
+                if changed or removed:
+                    pending_changed = (pending_changed | changed) - removed
+                    pending_removed = (pending_removed | removed) - changed
+                    last_change = time.monotonic()
+                elif last_change is not None and time.monotonic() - last_change >= debounce:
+                    print(f"\nDetected {len(pending_changed)} changed and "
+                          f"{len(pending_removed)} removed files")
+                    self.reindex(pending_changed, pending_removed)
+                    pending_changed = set()
+                    pending_removed = set()
+                    last_change = None
+        except KeyboardInterrupt:
+            print("\nStopping watch mode")
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+    
+    def publish(self, keep_build=False):
+        """Atomically replace the live database with the finished build.
+        
+        With keep_build the build file and its connection stay open, so a
+        long-running process can keep indexing into it.
+        """
+        with span('finalize', 'processor'):
+            self.conn.commit()
+            if not keep_build:
+                self.conn.close()
+                self.conn = None
+            with self.stats.timer('publish'):
+                publish_database(self.build_path, self.db_path, keep_build=keep_build)
+            print(f"Database published: {self.db_path}")
+            
+            if self.reproducible:
+                self.record_content_hash()
+    
+    def record_content_hash(self):
+        """Record the content hash of the published database.
+        
+        Returns True when the content differs from the previous build, so
+        downstream packaging can short-circuit on an unchanged hash.
+        """
+        content_hash = self.calculate_file_hash(self.db_path)
+        previous_hash = None
+        if self.hash_path.exists():
+            previous_hash = self.hash_path.read_text(encoding='utf-8').split()[0]
+        
+        with open(self.hash_path, 'w', encoding='utf-8') as f:
+            f.write(f"{content_hash}  {self.db_path.name}\n")
+        
+        if content_hash == previous_hash:
+            print(f"  Content hash unchanged: {content_hash}")
+            return False
+        
+        print(f"  Content hash: {content_hash}")
+        return True
+    
+    def generate_processing_report(self):
+        """Generate text and JSON reports from the running counters"""
+        # Summary statistics come from the running totals, not the database
+        doc_count = len(self.index_documents)
+        total_pages = sum(pages for author, pages, words in self.index_documents.values())
+        total_words = sum(words for author, pages, words in self.index_documents.values())
+        term_count = len(self.index_terms)
+        
+        # Documents by author, most documents first
+        author_totals = {}
+        for author, pages, words in self.index_documents.values():
+            docs_so_far, pages_so_far, words_so_far = author_totals.get(author, (0, 0, 0))
+            author_totals[author] = (docs_so_far + 1, pages_so_far + pages, words_so_far + words)
+        by_author = sorted(((author,) + totals for author, totals in author_totals.items()),
+                           key=lambda row: (-row[1], row[0]))
         
         # Write report
         report_file = self.output_dir / "processing_report.txt"
         with open(report_file, 'w', encoding='utf-8') as f:
             f.write("BAHAI RESOURCE LIBRARY - DOCUMENT PROCESSING REPORT\n")
             f.write("=" * 60 + "\n\n")
-            f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            generated = datetime.fromisoformat(self.timestamp())
+            f.write(f"Generated: {generated.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
             
             f.write("SUMMARY STATISTICS\n")
             f.write("-" * 20 + "\n")
@@ -491,6 +812,24 @@ class BahaiDocumentProcessor:
             f.write(f"Text Files: {self.text_dir}/*.txt\n")
             f.write(f"Report: {report_file}\n")
         
+        # Machine-readable counterpart for CI throughput tracking
+        json_report_file = report_file.with_suffix('.json')
+        report = {
+            'generated': self.timestamp(),
+            'database': str(self.db_path),
+            'run': self.stats.to_dict(),
+            'index': {
+                'documents': doc_count,
+                'pages': total_pages,
+                'words': total_words,
+                'search_terms': term_count,
+                'by_author': {author: {'documents': docs, 'pages': pages, 'words': words}
+                              for author, docs, pages, words in by_author}
+            }
+        }
+        with open(json_report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        
         print(f"Processing report saved: {report_file}")
         print(f"Ready for Android app integration!")
 
@@ -500,6 +839,17 @@ def main():
     parser.add_argument('--documents-dir', default='documents', 
                        help='Directory containing PDF documents')
     parser.add_argument('--single-file', help='Process a single PDF file')
+    parser.add_argument('--reproducible', action='store_true',
+                       help='Build a byte-identical database from the same inputs')
+    parser.add_argument('--build-timestamp',
+                       help='Fixed ISO-8601 or epoch timestamp (default: SOURCE_DATE_EPOCH)')
+    parser.add_argument('--watch', action='store_true',
+                       help='Keep running and re-index documents as they change')
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                       help='Seconds between scans in watch mode')
+    parser.add_argument('--debounce', type=float, default=2.0,
+                       help='Quiet period in seconds before a watch-mode re-index')
+    add_instrumentation_arguments(parser)
     
     args = parser.parse_args()
     
@@ -512,12 +862,21 @@ def main():
         print("Please install: pip install pdfplumber PyPDF2")
         return
     
-    processor = BahaiDocumentProcessor(args.documents_dir)
+    configure_from_args(args)
+    processor = BahaiDocumentProcessor(args.documents_dir,
+                                       reproducible=args.reproducible,
+                                       build_timestamp=args.build_timestamp)
     
-    if args.single_file:
-        processor.process_document(Path(args.single_file))
-    else:
-        processor.process_all_documents()
+    try:
+        if args.single_file:
+            processor.process_document(Path(args.single_file))
+            processor.publish()
+        elif args.watch:
+            processor.watch(interval=args.poll_interval, debounce=args.debounce)
+        else:
+            processor.process_all_documents()
+    finally:
+        finish_instrumentation(args.trace)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
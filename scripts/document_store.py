@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Document Store
+Keeps one copy of every document, keyed by SHA-256, shared by all collectors
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_STORE_DIR = "documents/.store"
+
+def hash_file(path):
+    """Calculate SHA-256 hash of file"""
+    hash_sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path across processes"""
+    with open(path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class ContentStore:
+    """Blob store keyed by SHA-256.
+
+    Every document body is stored once under blobs/<aa>/<digest>. The
+    human-readable paths used by the downloaders and the collector are
+    hardlinks to the blob (or copies where hardlinks are unavailable), and
+    manifest.json maps each path to its digest. Identical documents written
+    under different paths therefore share storage, and the processor can
+    look up a file's hash instead of reading it.
+
+    Linked paths share their blob's contents: replace them, don't edit them
+    in place. In-place edits are detected through the blob's size and
+    modification time and make the path fall back to hashing.
+
+    Several components (and processes) keep their own ContentStore on the
+    same directory, so save() merges the paths this instance linked into
+    the manifest on disk instead of overwriting it.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = Path(root)
+        self.blobs_dir = self.root / "blobs"
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.root / "manifest.json"
+        self.lock_path = self.root / "manifest.lock"
+        self.lock = threading.Lock()
+        # Paths linked since the last save
+        self.dirty = set()
+        self.manifest = self.read_manifest()
+
+    def read_manifest(self):
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'paths': {}}
+
+    def save(self):
+        """Merge this store's links into the manifest on disk (atomically)"""
+        with self.lock, file_lock(self.lock_path):
+            manifest = self.read_manifest()
+            for key in self.dirty:
+                manifest['paths'][key] = self.manifest['paths'][key]
+            data = json.dumps(manifest, indent=2, sort_keys=True, ensure_ascii=False)
+            temp_path = self.manifest_path.with_name(
+                f"{self.manifest_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, self.manifest_path)
+            self.manifest = manifest
+            self.dirty.clear()
+
+    def key(self, path):
+        """Manifest key for a path: relative to the documents tree, posix style"""
+        return Path(os.path.relpath(Path(path).resolve(), self.root.resolve().parent)).as_posix()
+
+    def blob_path(self, digest):
+        return self.blobs_dir / digest[:2] / digest
+
+    def put_file(self, source_path, digest):
+        """Move a fully written file into the store under its digest.
+
+        If the blob already exists the source is simply dropped.
+        """
+        blob = self.blob_path(digest)
+        if blob.exists():
+            os.unlink(source_path)
+        else:
+            blob.parent.mkdir(exist_ok=True)
+            os.replace(source_path, blob)
+        return blob
+
+    def put_bytes(self, data):
+        """Store data and return its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(exist_ok=True)
+            temp_path = blob.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, blob)
+        return digest
+
+    def link(self, digest, dest):
+        """Atomically point dest at the blob for digest"""
+        blob = self.blob_path(digest)
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+
+        if not (dest.exists() and os.path.samefile(dest, blob)):
+            temp_path = dest.with_name(dest.name + '.link')
+            if temp_path.exists():
+                temp_path.unlink()
+            try:
+                os.link(blob, temp_path)
+            except OSError:
+                # Filesystems without hardlinks get a private copy
+                shutil.copyfile(blob, temp_path)
+            os.replace(temp_path, dest)
+
+        stat = blob.stat()
+        key = self.key(dest)
+        with self.lock:
+            self.manifest['paths'][key] = {
+                'sha256': digest,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns
+            }
+            self.dirty.add(key)
+        return dest
+
+    def write(self, dest, data):
+        """Store data (bytes or str) and link it at dest; returns the digest"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = self.put_bytes(data)
+        self.link(digest, dest)
+        return digest
+
+    def import_file(self, path):
+        """Move an existing file into the store, replacing it with a link"""
+        digest = self.digest_for(path) or hash_file(path)
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(exist_ok=True)
+            shutil.copyfile(path, blob)
+        self.link(digest, path)
+        return digest
+
+    def digest_for(self, path):
+        """SHA-256 of a linked path without reading it, or None if unknown"""
+        with self.lock:
+            entry = self.manifest['paths'].get(self.key(path))
+        if not entry:
+            return None
+        blob = self.blob_path(entry['sha256'])
+        try:
+            if not os.path.samefile(path, blob):
+                return None
+            stat = blob.stat()
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (entry['size'], entry['mtime_ns']):
+            return None
+        return entry['sha256']
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Concurrent Download Engine
+Runs downloads in a thread pool with a per-host politeness budget, and
+retries failures with backoff behind a per-host circuit breaker
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+from download_sink import IncompleteDownloadError
+
+# Connect quickly or give up: a degraded mirror should fail in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+class TokenBucket:
+    """Token bucket allowing `rate` requests per second with bursts of `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            # Sleep outside the lock so other threads can check their hosts
+            time.sleep(wait)
+
+class HostRateLimiter:
+    """One token bucket per host, created on first use"""
+
+    def __init__(self, rate=1.0, burst=1, host_rates=None):
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = host_rates or {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                rate = self.host_rates.get(host, self.rate)
+                self.buckets[host] = TokenBucket(rate, self.burst)
+            return self.buckets[host]
+
+    def acquire(self, host):
+        self.bucket(host).acquire()
+
+def url_host(url):
+    """Host part of a URL, used as the rate limiting key"""
+    return urlparse(url).netloc
+
+def interleave_by_host(jobs, host_of):
+    """Reorder jobs round-robin across hosts.
+
+    Workers waiting on one host's rate limit would otherwise sit idle while
+    jobs for other hosts queue up behind them.
+    """
+    by_host = {}
+    for index, job in enumerate(jobs):
+        by_host.setdefault(host_of(job), []).append((index, job))
+
+    ordered = []
+    queues = list(by_host.values())
+    while queues:
+        for queue in queues:
+            ordered.append(queue.pop(0))
+        queues = [queue for queue in queues if queue]
+    return ordered
+
+class ConcurrentDownloadEngine:
+    """Thread pool download runner.
+
+    A global cap limits how many downloads run at once, and each host gets
+    its own token bucket, so total wall time is bounded by the busiest
+    host's politeness budget rather than by the sum of all requests.
+    """
+
+    def __init__(self, max_workers=4, rate_per_host=1.0, burst=1, host_rates=None):
+        self.max_workers = max_workers
+        self.limiter = HostRateLimiter(rate_per_host, burst, host_rates)
+
+    def run(self, func, jobs, host_of):
+        """Call func(job) for every job and return the results in job order"""
+        results = [None] * len(jobs)
+
+        def worker(index, job):
+            self.limiter.acquire(host_of(job))
+            results[index] = func(job)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(worker, index, job)
+                       for index, job in interleave_by_host(jobs, host_of)]
+            for future in futures:
+                future.result()
+
+        return results
+
+class CircuitOpenError(Exception):
+    """Raised without touching the network while a host's circuit is open"""
+
+def is_retryable(error):
+    """Whether a failed request is worth another attempt"""
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return response is not None and response.status_code in RETRYABLE_STATUSES
+    return isinstance(error, (requests.ConnectionError,
+                              requests.Timeout,
+                              requests.exceptions.ChunkedEncodingError,
+                              IncompleteDownloadError))
+
+def raise_for_retryable_status(response):
+    """Turn a transient HTTP status into an exception the retry loop sees"""
+    if response.status_code in RETRYABLE_STATUSES:
+        response.raise_for_status()
+    return response
+
+class RetryPolicy:
+    """Jittered exponential backoff with a retry budget shared by all calls.
+
+    Each retry spends one unit of the budget and each successful call earns
+    back refill_ratio of one, up to the initial budget. While requests keep
+    failing the budget runs out and failures are returned immediately, so a
+    bad stretch cannot spend its time retrying; once requests succeed again
+    retries become available again, at most about one per 1/refill_ratio
+    successes.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, budget=20,
+                 refill_ratio=0.1):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.capacity = budget
+        self.budget = budget
+        self.refill_ratio = refill_ratio
+        self.lock = threading.Lock()
+
+    def delay(self, attempt):
+        """Full-jitter backoff before retry number attempt (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def spend(self):
+        """Take one retry from the budget; False once it is used up"""
+        with self.lock:
+            if self.budget < 1:
+                return False
+            self.budget -= 1
+            return True
+
+    def refill(self):
+        """Earn back part of a retry after a successful call"""
+        with self.lock:
+            self.budget = min(self.capacity, self.budget + self.refill_ratio)
+
+class CircuitBreaker:
+    """Per-host circuit breaker.
+
+    After failure_threshold consecutive failures a host's circuit opens and
+    requests to it fail straight away. Once reset_timeout seconds have
+    passed a single trial request is let through (half-open): success closes
+    the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = {}
+        self.opened_at = {}
+        self.trial_in_progress = set()
+        self.lock = threading.Lock()
+
+    def allow(self, host):
+        with self.lock:
+            opened_at = self.opened_at.get(host)
+            if opened_at is None:
+                return True
+            if host in self.trial_in_progress:
+                return False
+            if time.monotonic() - opened_at >= self.reset_timeout:
+                self.trial_in_progress.add(host)
+                return True
+            return False
+
+    def record_success(self, host):
+        with self.lock:
+            self.failures.pop(host, None)
+            self.opened_at.pop(host, None)
+            self.trial_in_progress.discard(host)
+
+    def record_failure(self, host):
+        with self.lock:
+            self.failures[host] = self.failures.get(host, 0) + 1
+            if host in self.trial_in_progress or self.failures[host] >= self.failure_threshold:
+                if host not in self.opened_at:
+                    print(f"  Circuit opened for {host}")
+                self.opened_at[host] = time.monotonic()
+                self.trial_in_progress.discard(host)
+
+class DownloadResilience:
+    """Retries, backoff and circuit breaking around network calls"""
+
+    def __init__(self, retry_policy=None, breaker=None):
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+
+    def call(self, url, func, limiter=None):
+        """Call func() for a request to url, retrying transient failures.
+
+        With a HostRateLimiter, every retry waits for the host's rate limit
+        like a new request would; the first attempt is the caller's to limit.
+        """
+        host = url_host(url)
+        attempt = 0
+        while True:
+            if not self.breaker.allow(host):
+                raise CircuitOpenError(f"Circuit open for {host}, skipping {url}")
+            if attempt and limiter is not None:
+                limiter.acquire(host)
+            try:
+                result = func()
+            except Exception as e:
+                if not is_retryable(e):
+                    # The host answered; this failure says nothing about its health
+                    self.breaker.record_success(host)
+                    raise
+                self.breaker.record_failure(host)
+                attempt += 1
+                if attempt >= self.retry_policy.max_attempts or not self.retry_policy.spend():
+                    raise
+                delay = self.retry_policy.delay(attempt - 1)
+                print(f"  Retrying {url} in {delay:.1f}s ({e.__class__.__name__})")
+                time.sleep(delay)
+            else:
+                self.breaker.record_success(host)
+                self.retry_policy.refill()
+                return result
+
+_shared_resilience = None
+_shared_lock = threading.Lock()
+
+def shared_resilience():
+    """Process-wide resilience layer, so every downloader sees the same
+    circuit state for a host"""
+    global _shared_resilience
+    with _shared_lock:
+        if _shared_resilience is None:
+            _shared_resilience = DownloadResilience()
+        return _shared_resilience
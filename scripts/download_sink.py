@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Streaming Download Sink
+Hashes downloads while they are written and commits them atomically
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+# How often (in bytes written) a resumable download saves its progress
+STATE_SAVE_INTERVAL = 1024 * 1024
+
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+class StreamingFileSink:
+    """Write a download to a temporary file, hashing it on the fly.
+
+    Nothing appears at the final path until commit(), which flushes the
+    data to disk and renames it into place, so a failed transfer never
+    leaves a truncated file behind. The SHA-256 and size are known as soon
+    as the last chunk is written, without reading the file back.
+
+    With a ContentStore the committed file goes into the store and the
+    final path becomes a link to it, deduplicating identical downloads.
+
+    Used as a context manager, the temporary file is discarded unless the
+    sink was committed.
+    """
+
+    def __init__(self, final_path, store=None):
+        self.final_path = Path(final_path)
+        self.store = store
+        self.temp_path = self.final_path.with_name(self.final_path.name + '.part')
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.committed = False
+        self.final_path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.temp_path, 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.committed:
+            self.abort()
+        return False
+
+    @property
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+    def write(self, chunk):
+        if chunk:
+            self.file.write(chunk)
+            self.hasher.update(chunk)
+            self.size += len(chunk)
+
+    def write_response(self, response, chunk_size=8192):
+        """Stream a requests response body into the sink"""
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            self.write(chunk)
+
+    def commit(self):
+        """Flush, fsync and atomically move the file into place"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        if self.store is not None:
+            self.store.put_file(self.temp_path, self.hexdigest)
+            self.store.link(self.hexdigest, self.final_path)
+        else:
+            os.replace(self.temp_path, self.final_path)
+        self.committed = True
+        return self.final_path
+
+    def abort(self):
+        """Discard the partial download"""
+        if not self.file.closed:
+            self.file.close()
+        if self.temp_path.exists():
+            self.temp_path.unlink()
+
+class IncompleteDownloadError(IOError):
+    """The transfer ended before the advertised length was received"""
+
+class ResumableFileSink(StreamingFileSink):
+    """Streaming sink that survives interrupted transfers.
+
+    The partial file is kept next to a small JSON sidecar recording the URL
+    and the validator (ETag, or Last-Modified for weak ETags) of the response
+    it came from. The next attempt asks only for the missing bytes with a
+    Range request guarded by If-Range, so the server sends the whole body
+    again if the document changed in the meantime.
+
+    Call request_headers() for the headers to send, start(response) once the
+    response arrives, then stream it in and commit(). Leaving the context
+    manager without committing keeps the partial file for the next attempt.
+    """
+
+    def __init__(self, final_path, url, store=None):
+        self.final_path = Path(final_path)
+        self.store = store
+        self.temp_path = self.final_path.with_name(self.final_path.name + '.part')
+        self.state_path = self.temp_path.with_name(self.temp_path.name + '.json')
+        self.url = url
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.saved_size = 0
+        self.expected_size = None
+        self.expected_digest = None
+        self.etag = None
+        self.last_modified = None
+        self.committed = False
+        self.final_path.parent.mkdir(parents=True, exist_ok=True)
+
+        state = self.load_state()
+        if state.get('url') == url and self.temp_path.exists():
+            self.etag = state.get('etag')
+            self.last_modified = state.get('last_modified')
+            # The final hash must cover the bytes we already have
+            with open(self.temp_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    self.hasher.update(chunk)
+                    self.size += len(chunk)
+            self.saved_size = self.size
+            self.file = open(self.temp_path, 'ab')
+        else:
+            self.file = open(self.temp_path, 'wb')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.committed:
+            self.suspend()
+        return False
+
+    def validator(self):
+        """Strong validator for If-Range, if the partial file has one"""
+        if self.etag and not self.etag.startswith('W/'):
+            return self.etag
+        return self.last_modified
+
+    def load_state(self):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self):
+        self.file.flush()
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': self.url,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'bytes': self.size,
+                'total': self.expected_size
+            }, f)
+        self.saved_size = self.size
+
+    def request_headers(self):
+        """Headers for the next request: a guarded Range if we can resume"""
+        # Byte offsets must refer to the stored representation
+        headers = {'Accept-Encoding': 'identity'}
+        if self.size and self.validator():
+            headers['Range'] = f"bytes={self.size}-"
+            headers['If-Range'] = self.validator()
+        return headers
+
+    def restart(self):
+        """Throw away the partial data and start from byte zero"""
+        self.file.seek(0)
+        self.file.truncate()
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def start(self, response):
+        """Adopt a response: append on 206, start over on any other success.
+
+        HTTP errors are raised; a 416 also drops the partial data, since the
+        server cannot serve the range it covers.
+        """
+        if response.status_code >= 400:
+            if response.status_code == 416:
+                self.restart()
+            response.raise_for_status()
+
+        if response.status_code == 206:
+            match = CONTENT_RANGE_PATTERN.match(response.headers.get('Content-Range', ''))
+            if not match or int(match.group(1)) != self.size:
+                self.restart()
+                raise IncompleteDownloadError(f"Unexpected Content-Range for {self.url}")
+            if match.group(3) != '*':
+                self.expected_size = int(match.group(3))
+            print(f"  Resuming at {self.size / 1024:.1f} KB")
+        else:
+            if self.size:
+                self.restart()
+            content_length = response.headers.get('Content-Length')
+            if content_length and not response.headers.get('Content-Encoding'):
+                self.expected_size = int(content_length)
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+
+        self.expected_digest = parse_sha256_digest(response.headers)
+        self.save_state()
+
+    def write(self, chunk):
+        super().write(chunk)
+        if self.size - self.saved_size >= STATE_SAVE_INTERVAL:
+            self.save_state()
+
+    def commit(self, expected_hash=None):
+        """Verify length and hash, then move the file into place.
+
+        A short transfer keeps the partial file for the next attempt; a hash
+        mismatch discards it, since resuming corrupt data cannot help.
+        """
+        if self.expected_size is not None and self.size != self.expected_size:
+            self.save_state()
+            raise IncompleteDownloadError(
+                f"Received {self.size} of {self.expected_size} bytes for {self.url}")
+
+        expected_hash = expected_hash or self.expected_digest
+        if expected_hash and self.hexdigest != expected_hash:
+            self.abort()
+            raise ValueError(f"SHA-256 mismatch for {self.url}")
+
+        path = super().commit()
+        if self.state_path.exists():
+            self.state_path.unlink()
+        return path
+
+    def suspend(self):
+        """Keep the partial download and its progress for a later resume"""
+        if self.file.closed:
+            return
+        if self.size:
+            self.save_state()
+            self.file.close()
+        else:
+            self.abort()
+
+    def abort(self):
+        super().abort()
+        if self.state_path.exists():
+            self.state_path.unlink()
+
+def parse_sha256_digest(headers):
+    """SHA-256 from a Repr-Digest or Digest header, as a hex string"""
+    for header, pattern in (('Repr-Digest', r'sha-256=:([A-Za-z0-9+/=]+):'),
+                            ('Digest', r'SHA-256=([A-Za-z0-9+/=]+)')):
+        match = re.search(pattern, headers.get(header, ''), re.IGNORECASE)
+        if match:
+            return base64.b64decode(match.group(1)).hex()
+    return None
+
+def write_file_atomic(path, data, store=None):
+    """Atomically replace path with data (bytes or str); returns the SHA-256"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if store is not None:
+        return store.write(path, data)
+    with StreamingFileSink(path) as sink:
+        sink.write(data)
+        sink.commit()
+    return sink.hexdigest
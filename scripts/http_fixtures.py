@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+HTTP Fixtures
+Records downloader traffic to cassettes and replays it from a local server
+"""
+
+import argparse
+import base64
+import hashlib
+import http.server
+import json
+import os
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+CASSETTE_VERSION = 1
+
+# Headers that describe one transfer rather than the document itself
+TRANSFER_HEADERS = frozenset({
+    'connection', 'content-encoding', 'content-length', 'content-range', 'date',
+    'keep-alive', 'server', 'set-cookie', 'transfer-encoding', 'vary'
+})
+
+# Fixed Last-Modified for synthetic documents, so every run sees the same validators
+SYNTHETIC_LAST_MODIFIED = formatdate(1577836800, usegmt=True)
+
+class Cassette:
+    """Recorded HTTP interactions, keyed by method and URL.
+
+    Stored as JSON: {"version": 1, "interactions": [{"request": {...},
+    "response": {"status", "headers", "body"}}]} with base64 bodies. Only
+    complete responses are kept; the fixture server derives 206 and 304
+    answers from them, so resume and revalidation can be replayed too.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.interactions = {}
+        self.lock = threading.Lock()
+        if self.path and self.path.exists():
+            self.load()
+
+    @staticmethod
+    def key(method, url):
+        return f"{method.upper()} {url}"
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for interaction in data.get('interactions', []):
+            request, response = interaction['request'], interaction['response']
+            self.interactions[self.key(request['method'], request['url'])] = {
+                'status': response['status'],
+                'headers': response.get('headers', {}),
+                'body': base64.b64decode(response.get('body', ''))
+            }
+
+    def save(self, path=None):
+        """Write the cassette (atomically)"""
+        path = Path(path) if path else self.path
+        with self.lock:
+            interactions = [{
+                'request': {'method': key.split(' ', 1)[0], 'url': key.split(' ', 1)[1]},
+                'response': {
+                    'status': response['status'],
+                    'headers': response['headers'],
+                    'body': base64.b64encode(response['body']).decode('ascii')
+                }
+            } for key, response in sorted(self.interactions.items())]
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CASSETTE_VERSION, 'interactions': interactions}, f, indent=2)
+        os.replace(temp_path, path)
+
+    def add(self, url, body, status=200, headers=None, method='GET'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        headers = {name: value for name, value in (headers or {}).items()
+                   if name.lower() not in TRANSFER_HEADERS}
+        with self.lock:
+            self.interactions[self.key(method, url)] = {
+                'status': status, 'headers': headers, 'body': body
+            }
+
+    def find(self, method, url):
+        with self.lock:
+            response = self.interactions.get(self.key(method, url))
+            if response is None and '#' in url:
+                response = self.interactions.get(self.key(method, url.split('#', 1)[0]))
+            if response is None and url.startswith('/'):
+                # Direct requests to the server only carry the path
+                for key, candidate in self.interactions.items():
+                    request_method, request_url = key.split(' ', 1)
+                    parts = urlsplit(request_url)
+                    if request_method == method.upper() and url == parts.path + (
+                            f"?{parts.query}" if parts.query else ''):
+                        return candidate
+        return response
+
+    def __len__(self):
+        return len(self.interactions)
+
+def synthetic_response(url, size):
+    """Deterministic stand-in document for a URL nobody recorded"""
+    seed = hashlib.sha256(url.encode('utf-8')).digest()
+    body = (seed * (size // len(seed) + 1))[:size]
+    return {
+        'status': 200,
+        'headers': {
+            'Content-Type': 'application/pdf' if url.endswith('.pdf') else 'application/octet-stream',
+            'ETag': f'"{hashlib.sha256(body).hexdigest()[:16]}"',
+            'Last-Modified': SYNTHETIC_LAST_MODIFIED
+        },
+        'body': body
+    }
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport adapter that saves every complete live response to a cassette"""
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        # Partial and not-modified answers depend on what the client already had
+        if response.status_code not in (206, 304):
+            # Reading the body here still lets callers iterate it afterwards
+            self.cassette.add(request.url, response.content, response.status_code,
+                              dict(response.headers), request.method)
+        return response
+
+class FixtureAdapter(HTTPAdapter):
+    """Transport adapter that sends every request to a local FixtureServer.
+
+    The original URL travels in the X-Fixture-Url header and is restored on
+    the response, so callers see the hosts they asked for and rate limits,
+    circuit breakers and metadata stay keyed by the real sites.
+    """
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, request, **kwargs):
+        original_url = request.url
+        parts = urlsplit(original_url)
+        local = request.copy()
+        local.url = self.base_url + (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        local.headers['X-Fixture-Url'] = original_url
+        local.headers.pop('Cookie', None)
+        # Never route the local hop through a configured proxy
+        kwargs['proxies'] = {}
+        response = super().send(local, **kwargs)
+        response.url = original_url
+        response.request = request
+        return response
+
+def install(session, target):
+    """Mount an adapter on a requests.Session for all http(s) traffic.
+
+    target is a FixtureServer to replay from, or a Cassette to record into.
+    """
+    if isinstance(target, Cassette):
+        adapter = RecordingAdapter(target)
+    else:
+        adapter = FixtureAdapter(target.base_url)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return adapter
+
+class FixtureRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.fixture.handle(self)
+
+class FixtureServer:
+    """Local stand-in for the document sites.
+
+    Serves a cassette over real sockets, answering conditional requests
+    (If-None-Match / If-Modified-Since) and Range / If-Range requests from
+    the recorded bodies. Each request can be slowed by a fixed latency
+    before the response and a bandwidth cap while the body is sent.
+
+    Faults are injected with error_rate (503 responses) and drop_rate
+    (connection closed half way through the body). Whether a request fails
+    depends only on the seed, the URL and how many times that URL has been
+    requested, so a run is reproducible however its threads interleave.
+
+    URLs missing from the cassette get a deterministic synthetic document of
+    synthetic_size bytes, or a 404 when synthetic_size is None.
+    """
+
+    def __init__(self, cassette=None, latency=0.0, bandwidth=None, error_rate=0.0,
+                 drop_rate=0.0, seed=0, synthetic_size=None, chunk_size=16384,
+                 host='127.0.0.1', port=0):
+        self.cassette = cassette if cassette is not None else Cassette()
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.seed = seed
+        self.synthetic_size = synthetic_size
+        self.chunk_size = chunk_size
+        self.attempts = Counter()
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), FixtureRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fixture = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def fault_for(self, url):
+        """None, '503' or 'drop' for this attempt at url"""
+        with self.lock:
+            self.attempts[url] += 1
+            attempt = self.attempts[url]
+        rng = random.Random(f"{self.seed}:{url}:{attempt}")
+        roll = rng.random()
+        if roll < self.error_rate:
+            return '503'
+        if roll < self.error_rate + self.drop_rate:
+            return 'drop'
+        return None
+
+    def lookup(self, url):
+        response = self.cassette.find('GET', url)
+        if response is None and self.synthetic_size is not None:
+            response = synthetic_response(url, self.synthetic_size)
+        return response
+
+    def handle(self, handler):
+        url = handler.headers.get('X-Fixture-Url') or handler.path
+        self.count('requests')
+        if self.latency:
+            time.sleep(self.latency)
+
+        fault = self.fault_for(url)
+        if fault == '503':
+            self.count('injected_503')
+            self.send_simple(handler, 503)
+            return
+
+        response = self.lookup(url)
+        if response is None:
+            self.send_simple(handler, 404)
+            return
+
+        status, body = response['status'], response['body']
+        headers = dict(response['headers'])
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+
+        if status == 200 and self.not_modified(handler, etag, last_modified):
+            self.count('not_modified')
+            handler.send_response(304)
+            for name in ('ETag', 'Last-Modified'):
+                if headers.get(name):
+                    handler.send_header(name, headers[name])
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+
+        start = self.range_start(handler, etag, last_modified) if status == 200 else None
+        if start is not None:
+            if start >= len(body):
+                handler.send_response(416)
+                handler.send_header('Content-Range', f"bytes */{len(body)}")
+                handler.send_header('Content-Length', '0')
+                handler.end_headers()
+                return
+            self.count('partial')
+            headers['Content-Range'] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+            status, body = 206, body[start:]
+
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header('Accept-Ranges', 'bytes')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+
+        if fault == 'drop':
+            self.count('injected_drop')
+            self.send_body(handler, body[:len(body) // 2])
+            handler.close_connection = True
+            try:
+                handler.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+        self.send_body(handler, body)
+
+    def send_simple(self, handler, status):
+        handler.send_response(status)
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+
+    def send_body(self, handler, body):
+        for offset in range(0, len(body), self.chunk_size):
+            chunk = body[offset:offset + self.chunk_size]
+            try:
+                handler.wfile.write(chunk)
+            except OSError:
+                return
+            self.count('bytes_sent', len(chunk))
+            if self.bandwidth:
+                time.sleep(len(chunk) / self.bandwidth)
+
+    @staticmethod
+    def not_modified(handler, etag, last_modified):
+        if_none_match = handler.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return bool(etag) and etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = handler.headers.get('If-Modified-Since')
+        return bool(last_modified) and if_modified_since == last_modified
+
+    @staticmethod
+    def range_start(handler, etag, last_modified):
+        """Start offset of a satisfiable open-ended Range request, or None"""
+        range_header = handler.headers.get('Range', '')
+        if not (range_header.startswith('bytes=') and range_header.endswith('-')):
+            return None
+        if_range = handler.headers.get('If-Range')
+        if if_range is not None and if_range not in (etag, last_modified):
+            # The client's partial copy is stale: send the whole document
+            return None
+        try:
+            return int(range_header[len('bytes='):-1])
+        except ValueError:
+            return None
+
+def record_downloader(cassette_path, downloader_name, base_dir):
+    """Run one of the downloaders against the live sites, recording its traffic"""
+    cassette = Cassette(cassette_path)
+    if downloader_name == 'essential':
+        from document_downloader import BahaiDocumentDownloader
+        downloader = BahaiDocumentDownloader(base_dir)
+        install(downloader.session, cassette)
+        downloader.download_essential_texts()
+    elif downloader_name == 'official':
+        from official_document_downloader import OfficialBahaiDownloader
+        downloader = OfficialBahaiDownloader(f"{base_dir}/official", f"{base_dir}/.store",
+                                             f"{base_dir}/.cache/search")
+        install(downloader.session, cassette)
+        downloader.download_all_official_documents()
+    else:
+        from simple_downloader import SimpleBahaiDownloader
+        downloader = SimpleBahaiDownloader(base_dir)
+        install(downloader.session, cassette)
+        downloader.create_sample_documents()
+    cassette.save()
+    print(f"Recorded {len(cassette)} interactions to {cassette_path}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Record and replay downloader HTTP traffic')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help='Record a downloader run against the live sites')
+    record.add_argument('cassette', help='Cassette file to write')
+    record.add_argument('downloader', choices=['essential', 'official', 'simple'])
+    record.add_argument('--base-dir', default='documents/.recording',
+                        help='Where the recorded run stores its downloads')
+
+    serve = subparsers.add_parser('serve', help='Serve a cassette from a local fixture server')
+    serve.add_argument('cassette', nargs='?', help='Cassette to replay')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--latency', type=float, default=0.0, help='Seconds before each response')
+    serve.add_argument('--bandwidth', type=float, help='Bytes per second per connection')
+    serve.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 503 responses')
+    serve.add_argument('--drop-rate', type=float, default=0.0,
+                       help='Fraction of connections dropped mid-body')
+    serve.add_argument('--seed', type=int, default=0)
+    serve.add_argument('--synthetic-size', type=int,
+                       help='Serve unknown URLs as synthetic documents of this many bytes')
+
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record_downloader(args.cassette, args.downloader, args.base_dir)
+        return
+
+    server = FixtureServer(Cassette(args.cassette), latency=args.latency,
+                           bandwidth=args.bandwidth, error_rate=args.error_rate,
+                           drop_rate=args.drop_rate, seed=args.seed,
+                           synthetic_size=args.synthetic_size, port=args.port)
+    print(f"Serving {len(server.cassette)} interactions on {server.base_url} (Ctrl+C to stop)")
+    print("Clients send the original URL in the X-Fixture-Url header")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"Served: {dict(server.stats)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Streaming Ingest Pipeline
+Downloads, extracts and indexes documents in one pass, without intermediate files
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+from document_downloader import BahaiDocumentDownloader
+from document_processor import BahaiDocumentProcessor, ProcessingStats
+from download_engine import ConcurrentDownloadEngine, DEFAULT_TIMEOUT, url_host
+from download_sink import StreamingFileSink
+from instrumentation import add_arguments as add_instrumentation_arguments
+from instrumentation import configure_from_args, finish as finish_instrumentation
+
+# Marks the end of a stage's output
+DONE = object()
+
+CONTENT_TYPE_EXTENSIONS = {
+    'application/pdf': '.pdf',
+    'text/plain': '.txt'
+}
+
+def document_extension(url, content_type):
+    """File type of a downloaded document, from its Content-Type or URL"""
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+    if media_type in CONTENT_TYPE_EXTENSIONS:
+        return CONTENT_TYPE_EXTENSIONS[media_type]
+    path = urlparse(url).path.lower()
+    for extension in CONTENT_TYPE_EXTENSIONS.values():
+        if path.endswith(extension):
+            return extension
+    return media_type or 'unknown'
+
+class StreamingIngestPipeline:
+    """Download -> extract -> index, connected by bounded queues.
+
+    Download workers stream each response into memory, hashing it as the
+    chunks arrive (and, with keep_raw, writing it through the usual atomic
+    sink and content store at the same time). Extraction workers turn the
+    in-memory bytes into pages, and the calling thread inserts them into
+    the build database, which stays single-writer.
+
+    Each queue holds at most queue_size documents, so a slow stage holds
+    back the ones before it instead of letting documents pile up in
+    memory. Documents whose hash is already indexed are dropped before
+    extraction. Without keep_raw nothing is written to the documents
+    directory and no document is ever read back from disk.
+
+    Documents are indexed as they finish, in no fixed order. With ordered
+    they are indexed in input order instead (rowids, and so the database
+    bytes, then depend only on the inputs): the indexing thread holds back
+    documents until every earlier one has been indexed or dropped, and
+    duplicates within the run are resolved in that order too.
+    """
+
+    def __init__(self, downloader, processor, keep_raw=False, download_workers=4,
+                 extract_workers=2, queue_size=4, rate_per_host=1.0, chunk_size=65536,
+                 ordered=False):
+        self.downloader = downloader
+        self.processor = processor
+        self.keep_raw = keep_raw
+        self.ordered = ordered
+        self.download_workers = download_workers
+        self.extract_workers = extract_workers
+        self.engine = ConcurrentDownloadEngine(max_workers=download_workers,
+                                               rate_per_host=rate_per_host)
+        self.chunk_size = chunk_size
+        self.downloaded = queue.Queue(maxsize=queue_size)
+        self.extracted = queue.Queue(maxsize=queue_size)
+        self.known_hashes = set()
+        self.lock = threading.Lock()
+
+    def fetch(self, doc):
+        """Stream one document into memory; returns (doc, path, bytes, digest, extension)"""
+        url = doc['url']
+        target = self.downloader.target_path(url, doc['title'], doc['author'])
+
+        def attempt():
+            response = self.downloader.session.get(url, stream=True, timeout=DEFAULT_TIMEOUT)
+            response.raise_for_status()
+            extension = document_extension(url, response.headers.get('Content-Type'))
+            # Raw copies are named for what they are, so a later run reads them right
+            filepath = target.with_suffix(extension) if extension.startswith('.') else target
+            buffer = io.BytesIO()
+            raw_sink = (StreamingFileSink(filepath, store=self.downloader.store)
+                        if self.keep_raw else contextlib.nullcontext())
+            with raw_sink as sink:
+                hasher = sink.hasher if sink else hashlib.sha256()
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    buffer.write(chunk)
+                    if sink:
+                        sink.write(chunk)
+                    else:
+                        hasher.update(chunk)
+                if sink:
+                    sink.commit()
+            return filepath, buffer.getvalue(), hasher.hexdigest(), extension, response.headers
+
+        with self.processor.stats.timer('download'):
+            filepath, data, digest, extension, headers = self.downloader.resilience.call(
+                url, attempt, self.engine.limiter)
+
+        if self.keep_raw:
+            self.downloader.metadata_store.put(url, {
+                'title': doc['title'],
+                'author': doc['author'],
+                'category': doc['category'],
+                'description': doc.get('description', ''),
+                'filename': filepath.name,
+                'filepath': str(filepath.relative_to(self.downloader.base_dir)),
+                'hash': digest,
+                'size': len(data),
+                'downloaded': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'source': url_host(url),
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified')
+            })
+        return doc, filepath, data, digest, extension
+
+    def download_stage(self, documents):
+        # Items carry the document's position; None stands for a dropped document
+        def download(job):
+            position, doc = job
+            try:
+                self.downloaded.put((position, self.fetch(doc)))
+            except Exception as e:
+                print(f"  Error downloading {doc['title']}: {e}")
+                self.processor.stats.record_failure(f"download_{type(e).__name__}")
+                self.downloaded.put((position, None))
+
+        try:
+            self.engine.run(download, list(enumerate(documents)),
+                            host_of=lambda job: url_host(job[1]['url']))
+        finally:
+            for _ in range(self.extract_workers):
+                self.downloaded.put(DONE)
+
+    def extract(self, doc, filepath, data, digest, extension):
+        """Pages of one downloaded document, or None if it is dropped"""
+        with self.lock:
+            duplicate = digest in self.known_hashes
+            # In order, the indexing thread decides which copy comes first
+            if not self.ordered:
+                self.known_hashes.add(digest)
+        if duplicate:
+            print(f"  Already processed: {doc['title']}")
+            with self.processor.stats.lock:
+                self.processor.stats.documents_skipped += 1
+            return None
+
+        try:
+            with self.processor.stats.timer('extract'):
+                text_pages = self.processor.extract_text_from_bytes(data, extension)
+        except Exception as e:
+            print(f"  Error extracting {doc['title']}: {e}")
+            self.processor.stats.record_failure(type(e).__name__)
+            return None
+        if not text_pages:
+            print(f"  Failed to extract text from {doc['title']}")
+            self.processor.stats.record_failure('no_text_extracted')
+            return None
+        return doc, filepath, digest, text_pages, len(data)
+
+    def extract_stage(self):
+        try:
+            while True:
+                item = self.downloaded.get()
+                if item is DONE:
+                    return
+                position, fetched = item
+                self.extracted.put((position, fetched and self.extract(*fetched)))
+        finally:
+            self.extracted.put(DONE)
+
+    def run(self, documents):
+        """Ingest documents (dicts with url, title, author, category and
+        description); returns the number of documents indexed"""
+        self.processor.stats = ProcessingStats()
+        self.known_hashes = self.processor.indexed_hashes()
+
+        threads = [threading.Thread(target=self.download_stage, args=(documents,), daemon=True)]
+        threads += [threading.Thread(target=self.extract_stage, daemon=True)
+                    for _ in range(self.extract_workers)]
+        for thread in threads:
+            thread.start()
+
+        indexed = 0
+        finished_workers = 0
+        held = {}
+        next_position = 0
+        while finished_workers < self.extract_workers:
+            item = self.extracted.get()
+            if item is DONE:
+                finished_workers += 1
+                continue
+            position, extracted = item
+            if not self.ordered:
+                if extracted:
+                    indexed += self.index(*extracted)
+                continue
+            held[position] = extracted
+            while next_position in held:
+                extracted = held.pop(next_position)
+                next_position += 1
+                if extracted:
+                    indexed += self.index(*extracted)
+        # A document lost to an unexpected error must not keep the rest out
+        for position in sorted(held):
+            if held[position]:
+                indexed += self.index(*held[position])
+
+        for thread in threads:
+            thread.join()
+        return indexed
+
+    def index(self, doc, filepath, digest, text_pages, size):
+        """Index one extracted document; returns 1 if it was added"""
+        if self.ordered:
+            with self.lock:
+                duplicate = digest in self.known_hashes
+                self.known_hashes.add(digest)
+            if duplicate:
+                print(f"  Already processed: {doc['title']}")
+                with self.processor.stats.lock:
+                    self.processor.stats.documents_skipped += 1
+                return 0
+        print(f"Indexing: {doc['title']}")
+        doc_meta = {
+            'title': doc['title'],
+            'author': doc['author'],
+            'category': doc['category'],
+            'description': doc.get('description', ''),
+            'url': doc['url']
+        }
+        try:
+            self.processor.index_document(filepath, digest, doc_meta, text_pages, size)
+            return 1
+        except Exception as e:
+            self.processor.conn.rollback()
+            self.processor.stats.record_failure(type(e).__name__)
+            print(f"Error indexing {doc['title']}: {e}")
+            return 0
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description='Download essential texts straight into the search index')
+    parser.add_argument('--documents-dir', default='documents',
+                        help='Documents directory (raw downloads, metadata, content store)')
+    parser.add_argument('--keep-raw', action='store_true',
+                        help='Also store the downloaded documents on disk')
+    parser.add_argument('--download-workers', type=int, default=4)
+    parser.add_argument('--extract-workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help='Documents buffered between stages')
+    parser.add_argument('--rate-per-host', type=float, default=1.0,
+                        help='Requests per second against any single host')
+    parser.add_argument('--reproducible', action='store_true',
+                        help='Build a byte-identical database from the same inputs '
+                             '(documents are indexed in input order)')
+    add_instrumentation_arguments(parser)
+
+    args = parser.parse_args()
+
+    print("Bahai Streaming Ingest Pipeline v0.2.0")
+    print("=" * 40)
+
+    downloader = BahaiDocumentDownloader(args.documents_dir)
+    processor = BahaiDocumentProcessor(args.documents_dir, reproducible=args.reproducible)
+    pipeline = StreamingIngestPipeline(downloader, processor,
+                                       keep_raw=args.keep_raw,
+                                       download_workers=args.download_workers,
+                                       extract_workers=args.extract_workers,
+                                       queue_size=args.queue_size,
+                                       rate_per_host=args.rate_per_host,
+                                       ordered=args.reproducible)
+
+    configure_from_args(args)
+    try:
+        documents = downloader.essential_documents()
+        indexed = pipeline.run(documents)
+        print(f"\nIndexed {indexed}/{len(documents)} documents")
+
+        if args.keep_raw:
+            downloader.save_metadata()
+            downloader.store.save()
+        processor.publish()
+        processor.generate_processing_report()
+    finally:
+        finish_instrumentation(args.trace)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Pipeline Instrumentation
+Timing spans with Chrome trace export, and opt-in cProfile/tracemalloc per stage
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+from download_sink import write_file_atomic
+
+DEFAULT_OUTPUT_DIR = "documents/.cache/profiles"
+
+# Lines shown in the text summaries of profiles and memory snapshots
+REPORT_LINES = 25
+
+def stage_file_name(stage):
+    """A stage name usable as a file name on every platform"""
+    return re.sub(r'[^\w.-]', '_', stage)
+
+class Tracer:
+    """Collects timed spans from every thread of this process.
+
+    Each span becomes a Chrome trace "complete" event, so an exported trace
+    opens in chrome://tracing or https://ui.perfetto.dev with one row per
+    thread. Spans can nest; keyword arguments are shown as event details.
+
+    A span whose name or category is in profile_stages also runs under
+    cProfile (one profiler per stage and thread, merged on export; a
+    profiled span inside another profiled span is counted in the outer
+    one). Spans matched by memory_stages record how much traced memory
+    they added and their peak, and the snapshot of the stage's biggest
+    span is kept. tracemalloc slows everything down and overlapping spans
+    share one peak, so memory figures are indicative only.
+    """
+
+    def __init__(self, profile_stages=(), memory_stages=(), output_dir=DEFAULT_OUTPUT_DIR):
+        self.profile_stages = set(profile_stages)
+        self.memory_stages = set(memory_stages)
+        self.output_dir = Path(output_dir)
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self.thread_names = {}
+        self.profiles = {}
+        self.snapshots = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        if self.memory_stages and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def selected(self, stages, name, category):
+        return bool(stages) and ('all' in stages or name in stages or category in stages)
+
+    def start_profile(self, stage):
+        if getattr(self.local, 'profiling', False):
+            return None
+        key = (stage, threading.get_ident())
+        with self.lock:
+            profiler = self.profiles.setdefault(key, cProfile.Profile())
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active (on 3.12+ profilers are per process)
+            return None
+        self.local.profiling = True
+        return profiler
+
+    def stop_profile(self, profiler):
+        profiler.disable()
+        self.local.profiling = False
+
+    @contextmanager
+    def span(self, name, category='pipeline', **args):
+        profiler = None
+        memory_before = None
+        if self.selected(self.memory_stages, name, category):
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        if self.selected(self.profile_stages, name, category):
+            profiler = self.start_profile(category if category in self.profile_stages else name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            if profiler is not None:
+                self.stop_profile(profiler)
+            if memory_before is not None:
+                current, peak = tracemalloc.get_traced_memory()
+                args['memory_added'] = current - memory_before
+                args['memory_peak'] = peak
+                self.keep_snapshot(category if category in self.memory_stages else name, peak)
+            self.record(name, category, start, end, args)
+
+    def keep_snapshot(self, stage, peak):
+        with self.lock:
+            previous = self.snapshots.get(stage)
+            if previous is not None and previous[0] >= peak:
+                return
+        snapshot = tracemalloc.take_snapshot()
+        with self.lock:
+            self.snapshots[stage] = (peak, snapshot)
+
+    def record(self, name, category, start, end, args):
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self.origin) * 1e6, 3),
+            'dur': round((end - start) * 1e6, 3),
+            'pid': self.pid,
+            'tid': thread.ident
+        }
+        if args:
+            event['args'] = {key: value if isinstance(value, (int, float, bool)) else str(value)
+                             for key, value in args.items()}
+        with self.lock:
+            self.events.append(event)
+            self.thread_names.setdefault(thread.ident, thread.name)
+
+    def summary(self):
+        """{span name: (count, total seconds)}, slowest first"""
+        totals = {}
+        with self.lock:
+            events = list(self.events)
+        for event in events:
+            count, seconds = totals.get(event['name'], (0, 0.0))
+            totals[event['name']] = (count + 1, seconds + event['dur'] / 1e6)
+        return dict(sorted(totals.items(), key=lambda item: item[1][1], reverse=True))
+
+    def export_chrome_trace(self, path):
+        """Write the spans as Chrome trace JSON"""
+        with self.lock:
+            events = sorted(self.events, key=lambda event: event['ts'])
+            thread_names = dict(self.thread_names)
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+                     'args': {'name': 'bahai-library'}}]
+        metadata += [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+                      'args': {'name': thread_name}}
+                     for tid, thread_name in sorted(thread_names.items())]
+        trace = {'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}
+        write_file_atomic(Path(path), json.dumps(trace))
+        return Path(path)
+
+    def write_profiles(self):
+        """Write <stage>.prof and <stage>.profile.txt for each profiled stage"""
+        by_stage = {}
+        with self.lock:
+            for (stage, _), profiler in self.profiles.items():
+                by_stage.setdefault(stage, []).append(profiler)
+        written = []
+        for stage, profilers in sorted(by_stage.items()):
+            stats = pstats.Stats(profilers[0])
+            for profiler in profilers[1:]:
+                stats.add(profiler)
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            base = self.output_dir / stage_file_name(stage)
+            stats.dump_stats(f"{base}.prof")
+
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats('cumulative').print_stats(REPORT_LINES)
+            write_file_atomic(Path(f"{base}.profile.txt"), text.getvalue())
+            written.append(Path(f"{base}.prof"))
+        return written
+
+    def write_snapshots(self):
+        """Write <stage>.tracemalloc and <stage>.memory.txt for each traced stage"""
+        with self.lock:
+            snapshots = dict(self.snapshots)
+        written = []
+        for stage, (peak, snapshot) in sorted(snapshots.items()):
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            base = self.output_dir / stage_file_name(stage)
+            snapshot_path = Path(f"{base}.tracemalloc")
+            snapshot.dump(str(snapshot_path))
+
+            lines = [f"Peak traced memory: {peak / (1024 * 1024):.1f} MB",
+                     f"Top {REPORT_LINES} allocation sites at the end of the largest span:"]
+            for statistic in snapshot.statistics('lineno')[:REPORT_LINES]:
+                lines.append(f"  {statistic}")
+            write_file_atomic(Path(f"{base}.memory.txt"), "\n".join(lines) + "\n")
+            written.append(snapshot_path)
+        return written
+
+# The process-wide tracer; spans are no-ops until configure() is called
+_tracer = None
+
+def configure(profile_stages=(), memory_stages=(), output_dir=DEFAULT_OUTPUT_DIR):
+    """Start recording spans in this process"""
+    global _tracer
+    _tracer = Tracer(profile_stages, memory_stages, output_dir)
+    return _tracer
+
+def span(name, category='pipeline', **args):
+    """Context manager timing one unit of work (free when tracing is off)"""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.span(name, category, **args)
+
+def add_arguments(parser):
+    """The --trace/--profile/--trace-memory options shared by the pipeline scripts"""
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--trace', metavar='PATH',
+                       help='Record timing spans and write them as Chrome trace JSON')
+    group.add_argument('--profile', metavar='STAGE', action='append', default=[],
+                       help='Run a stage (span name or category, or "all") under cProfile (repeatable)')
+    group.add_argument('--trace-memory', metavar='STAGE', action='append', default=[],
+                       help='Record tracemalloc figures and a snapshot for a stage (repeatable)')
+    group.add_argument('--profile-dir', default=DEFAULT_OUTPUT_DIR,
+                       help='Where profiles and memory snapshots are written')
+
+def configure_from_args(args):
+    """Start tracing if any instrumentation option was given"""
+    if args.trace or args.profile or args.trace_memory:
+        return configure(args.profile, args.trace_memory, args.profile_dir)
+    return None
+
+def finish(trace_path=None):
+    """Write the trace, profiles and snapshots, print a summary and stop tracing"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return
+    summary = tracer.summary()
+    if summary:
+        print("\nTime by span (including nested spans):")
+        for name, (count, seconds) in summary.items():
+            print(f"  {name:<30} {count:>6}x  {seconds:10.3f}s")
+    if trace_path:
+        print(f"Chrome trace written: {tracer.export_chrome_trace(trace_path)}")
+    for path in tracer.write_profiles() + tracer.write_snapshots():
+        print(f"Written: {path}")
+    if tracer.memory_stages and tracemalloc.is_tracing():
+        tracemalloc.stop()
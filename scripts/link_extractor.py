@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Streaming Link Extractor
+Pulls PDF links out of HTML pages without building a document tree
+"""
+
+import codecs
+import re
+from html.parser import HTMLParser
+
+CHARSET_PATTERN = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+# How much of the page is searched for a <meta charset>
+META_SNIFF_BYTES = 4096
+
+class PdfLinkExtractor(HTMLParser):
+    """Collect (href, text) for every <a> whose href ends in .pdf.
+
+    Fed incrementally, so a page can be parsed while it downloads. The
+    link text matches BeautifulSoup's get_text(strip=True): every text
+    fragment inside the anchor, stripped and joined without separators.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self.current_href = None
+        self.current_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a' or self.current_href is not None:
+            return
+        href = dict(attrs).get('href')
+        if href and href.endswith('.pdf'):
+            self.current_href = href
+            self.current_text = []
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self.current_href is not None:
+            self.links.append((self.current_href, ''.join(self.current_text)))
+            self.current_href = None
+
+    def handle_data(self, data):
+        if self.current_href is not None:
+            text = data.strip()
+            if text:
+                self.current_text.append(text)
+
+    def close(self):
+        super().close()
+        if self.current_href is not None:
+            # Unterminated anchor at the end of the page
+            self.handle_endtag('a')
+
+def extract_pdf_links(html):
+    """PDF links in an HTML string"""
+    parser = PdfLinkExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.links
+
+def known_encoding(name):
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+def response_charset(response, head):
+    """Charset of an HTML response: the Content-Type charset if the server
+    sent one, else a <meta charset> near the start of the page, else UTF-8.
+
+    response.encoding is not used: for text/html without a charset requests
+    assumes ISO-8859-1, which mangles UTF-8 pages.
+    """
+    match = CHARSET_PATTERN.search(response.headers.get('Content-Type', ''))
+    charset = match and known_encoding(match.group(1))
+    if not charset:
+        match = META_CHARSET_PATTERN.search(head[:META_SNIFF_BYTES])
+        charset = match and known_encoding(match.group(1).decode('ascii'))
+    return charset or 'utf-8'
+
+def extract_pdf_links_from_response(response, chunk_size=16384):
+    """PDF links in a streamed requests response, parsed as it arrives"""
+    parser = PdfLinkExtractor()
+    decoder = None
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(response_charset(response, chunk))(errors='replace')
+        parser.feed(decoder.decode(chunk))
+    if decoder is None:
+        return []
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    return parser.links
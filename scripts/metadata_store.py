@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Document Metadata Store
+Transactional, indexed catalog of downloaded documents backed by SQLite
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import PurePosixPath, Path
+
+UPSERT_SQL = '''
+    INSERT INTO documents (url, filepath, filename, hash, data)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        filepath = excluded.filepath,
+        filename = excluded.filename,
+        hash = excluded.hash,
+        data = excluded.data
+'''
+
+def normalize_path(path):
+    """Catalog paths use the host's separator; index them in posix form"""
+    return (path or '').replace('\\', '/')
+
+class MetadataStore:
+    """Catalog of documents keyed by URL.
+
+    Each entry is written in its own transaction, so an update costs one
+    row rather than a rewrite of the whole catalog, and a crash can never
+    leave a half-written file. Entries are indexed by URL, path, filename
+    and hash.
+
+    The legacy document_metadata.json stays the interchange format: it is
+    imported automatically when it is newer than the last import or
+    export, replacing the store's entries, and export_json() writes it
+    back in the same layout.
+    """
+
+    def __init__(self, db_path="documents/document_metadata.db", json_path=None):
+        self.db_path = Path(db_path)
+        self.json_path = Path(json_path) if json_path else self.db_path.with_suffix('.json')
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS documents (
+                url TEXT PRIMARY KEY,
+                filepath TEXT,
+                filename TEXT,
+                hash TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_filepath ON documents(filepath);
+            CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents(filename);
+            CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(hash);
+            CREATE TABLE IF NOT EXISTS info (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        ''')
+        self.conn.commit()
+
+        if self.json_path.exists() and self.json_path.stat().st_mtime_ns > self.json_synced_mtime():
+            self.import_json(self.json_path)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def get_info(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_info(self, key, value):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+                              (key, json.dumps(value, ensure_ascii=False)))
+            self.conn.commit()
+
+    def json_synced_mtime(self):
+        """mtime of the JSON file as of the last import or export"""
+        return self.get_info('json_mtime_ns', 0)
+
+    def row_values(self, url, entry):
+        filepath = normalize_path(entry.get('filepath'))
+        return (url, filepath, PurePosixPath(filepath).name if filepath else entry.get('filename'),
+                entry.get('hash'), json.dumps(entry, ensure_ascii=False))
+
+    def put(self, url, entry):
+        """Insert or update one entry in its own transaction"""
+        with self.lock:
+            self.conn.execute(UPSERT_SQL, self.row_values(url, entry))
+            self.conn.commit()
+
+    def delete(self, url):
+        with self.lock:
+            self.conn.execute("DELETE FROM documents WHERE url = ?", (url,))
+            self.conn.commit()
+
+    def query_one(self, column, value):
+        # Oldest entry wins, matching a first-match scan of the JSON catalog
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT data FROM documents WHERE {column} = ? ORDER BY rowid LIMIT 1",
+                (value,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get(self, url):
+        return self.query_one('url', url)
+
+    def by_path(self, filepath):
+        return self.query_one('filepath', normalize_path(filepath))
+
+    def by_filename(self, filename):
+        return self.query_one('filename', filename)
+
+    def by_hash(self, file_hash):
+        return self.query_one('hash', file_hash)
+
+    def items(self):
+        """All (url, entry) pairs in insertion order"""
+        with self.lock:
+            rows = self.conn.execute("SELECT url, data FROM documents ORDER BY rowid").fetchall()
+        return [(url, json.loads(data)) for url, data in rows]
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def is_json_path(self, json_path):
+        """Whether json_path is the catalog this store keeps in sync with"""
+        return Path(json_path).resolve() == self.json_path.resolve()
+
+    def import_json(self, json_path, merge=False):
+        """Load a document_metadata.json catalog into the store.
+
+        By default the file replaces the store's entries, so documents
+        deleted since the file was written stay deleted and entries missing
+        from the file are dropped. With merge=True its entries are only
+        added or updated. Either way the import is one transaction.
+        """
+        with open(json_path, 'r', encoding='utf-8') as f:
+            catalog = json.load(f)
+        info = [(key, json.dumps(value, ensure_ascii=False))
+                for key, value in catalog.items() if key != 'documents']
+        if self.is_json_path(json_path):
+            info.append(('json_mtime_ns', json.dumps(Path(json_path).stat().st_mtime_ns)))
+
+        with self.lock:
+            with self.conn:
+                if not merge:
+                    self.conn.execute("DELETE FROM documents")
+                for url, entry in catalog.get('documents', {}).items():
+                    self.conn.execute(UPSERT_SQL, self.row_values(url, entry))
+                self.conn.executemany("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", info)
+
+    def export_json(self, json_path=None):
+        """Write the catalog in the document_metadata.json layout"""
+        json_path = Path(json_path) if json_path else self.json_path
+        catalog = {'documents': dict(self.items())}
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, value FROM info WHERE key != 'json_mtime_ns' ORDER BY rowid").fetchall()
+        for key, value in rows:
+            catalog[key] = json.loads(value)
+
+        temp_path = json_path.with_name(json_path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, json_path)
+        if self.is_json_path(json_path):
+            self.set_info('json_mtime_ns', json_path.stat().st_mtime_ns)
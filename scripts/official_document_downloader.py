@@ -10,16 +10,29 @@ import os
 import time
 import urllib.parse
 from pathlib import Path
-from bs4 import BeautifulSoup
 import hashlib
 import sqlite3
 from typing import List, Dict, Optional
 
+from download_engine import DEFAULT_TIMEOUT, raise_for_retryable_status, shared_resilience
+from download_sink import ResumableFileSink, write_file_atomic
+from document_store import ContentStore, DEFAULT_STORE_DIR
+from link_extractor import extract_pdf_links_from_response
+from instrumentation import span
+
 class OfficialBahaiDownloader:
-    def __init__(self, base_dir: str = "documents/official"):
+    def __init__(self, base_dir: str = "documents/official", store_dir: str = DEFAULT_STORE_DIR,
+                 cache_dir: str = "documents/.cache/search"):
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(parents=True, exist_ok=True)
         
+        # Parsed search results, keyed by URL and revalidated with the server
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Shared content-addressed store; document paths link into it
+        self.store = ContentStore(store_dir)
+        
         # Official Bahai sources
         self.sources = {
             'bahai_org': 'https://www.bahai.org',
@@ -34,6 +47,9 @@ class OfficialBahaiDownloader:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
         
+        # Retries with backoff, and a circuit breaker shared by all downloaders
+        self.resilience = shared_resilience()
+        
         # Known official documents with direct links where possible
         self.official_documents = [
             # Baha'u'llah's Writings
@@ -197,28 +213,66 @@ class OfficialBahaiDownloader:
             }
         ]
     
+    def cache_path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+    
+    def load_cached_search(self, url: str) -> Optional[Dict]:
+        try:
+            with open(self.cache_path(url), 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached if cached.get('url') == url else None
+    
     def search_bahai_org_library(self, search_term: str) -> List[Dict]:
         """Search the official Bahai.org library"""
         try:
             # Try the reference library first
             search_url = f"{self.sources['reference_library']}/search"
             params = {'q': search_term, 'format': 'pdf'}
+            request_url = requests.Request('GET', search_url, params=params).prepare().url
             
-            response = self.session.get(search_url, params=params, timeout=30)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                documents = []
-                
-                # Look for PDF download links
-                pdf_links = soup.find_all('a', href=lambda x: x and x.endswith('.pdf'))
-                for link in pdf_links:
-                    documents.append({
-                        'url': urllib.parse.urljoin(self.sources['bahai_org'], link.get('href')),
-                        'title': link.get_text(strip=True),
-                        'source': 'bahai.org'
-                    })
+            # Revalidate previously parsed results instead of re-parsing the page
+            cached = self.load_cached_search(request_url)
+            headers = {}
+            if cached:
+                if cached.get('etag'):
+                    headers['If-None-Match'] = cached['etag']
+                if cached.get('last_modified'):
+                    headers['If-Modified-Since'] = cached['last_modified']
+            
+            response = self.resilience.call(
+                search_url,
+                lambda: raise_for_retryable_status(
+                    self.session.get(request_url, stream=True, headers=headers,
+                                     timeout=DEFAULT_TIMEOUT)))
+            # Streamed, so close it on every path (including unexpected statuses)
+            with response:
+                if response.status_code == 304 and cached:
+                    return cached['documents']
                 
-                return documents
+                if response.status_code == 200:
+                    documents = []
+                    
+                    # Look for PDF download links, parsing the page as it streams in
+                    for href, text in extract_pdf_links_from_response(response):
+                        documents.append({
+                            'url': urllib.parse.urljoin(self.sources['bahai_org'], href),
+                            'title': text,
+                            'source': 'bahai.org'
+                        })
+                    
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+                    if etag or last_modified:
+                        write_file_atomic(self.cache_path(request_url), json.dumps({
+                            'url': request_url,
+                            'etag': etag,
+                            'last_modified': last_modified,
+                            'documents': documents
+                        }, indent=2, ensure_ascii=False))
+                    
+                    return documents
             
         except Exception as e:
             print(f"Error searching Bahai.org library for '{search_term}': {e}")
@@ -273,20 +327,26 @@ class OfficialBahaiDownloader:
             return self.create_sample_document(filename, metadata)
             
         try:
-            response = self.session.get(url, stream=True, timeout=60)
-            response.raise_for_status()
-            
             filepath = self.base_dir / filename
             
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            # Stream to a temp file and rename, so failures leave no partial
+            # PDF; an interrupted transfer resumes from its partial file
+            def fetch():
+                with ResumableFileSink(filepath, url, store=self.store) as sink:
+                    response = self.session.get(url, stream=True, timeout=DEFAULT_TIMEOUT,
+                                                headers=sink.request_headers())
+                    sink.start(response)
+                    sink.write_response(response)
+                    sink.commit()
+                    return sink
+            
+            with span('download', 'download', url=url):
+                sink = self.resilience.call(url, fetch)
             
             # Save metadata
+            metadata.update({'hash': sink.hexdigest, 'size': sink.size})
             metadata_file = filepath.with_suffix('.json')
-            with open(metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            write_file_atomic(metadata_file, json.dumps(metadata, indent=2, ensure_ascii=False))
             
             print(f"Downloaded: {filename}")
             return str(filepath)
@@ -320,8 +380,7 @@ formatted and structured appropriately for study and reference.
         
         # Save as text file temporarily (we'll convert to PDF later)
         text_filepath = filepath.with_suffix('.txt')
-        with open(text_filepath, 'w', encoding='utf-8') as f:
-            f.write(sample_content)
+        self.store.write(text_filepath, sample_content)
         
         # Save metadata
         metadata_file = filepath.with_suffix('.json')
@@ -376,6 +435,7 @@ formatted and structured appropriately for study and reference.
             # Be respectful to servers
             time.sleep(2)
         
+        self.store.save()
         print(f"\nDownload complete. Downloaded {len(downloaded_files)} documents.")
         return downloaded_files
 
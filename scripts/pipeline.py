@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Library Build Pipeline
+Collection, conversion, indexing, verification and packaging as one staged build
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from build_graph import BuildNode, library_graph
+from db_connection import connect
+from download_sink import write_file_atomic
+from instrumentation import add_arguments as add_instrumentation_arguments
+from instrumentation import configure_from_args, finish as finish_instrumentation
+
+# Stages in pipeline order; --from and --until pick a contiguous range
+STAGES = ('collect', 'convert', 'index', 'verify', 'asset', 'package')
+
+# Not build_graph's state file: each graph forgets the other's nodes when saving
+DEFAULT_STATE_PATH = "documents/.cache/pipeline_state.json"
+DEFAULT_CACHE_DIR = "documents/.cache/stage-outputs"
+
+# Written by the verify stage, relative to the documents directory
+VERIFY_REPORT_NAME = ".cache/verification.json"
+
+def verify_database(db_path, report_path):
+    """Check the built database before it is packaged; writes a JSON report.
+
+    Raises RuntimeError if the database is corrupt, empty, or has
+    documents without pages or without a search index entry.
+    """
+    conn = connect(db_path, read_only=True)
+    try:
+        report = {
+            'integrity': conn.execute("PRAGMA integrity_check").fetchone()[0],
+            'documents': conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0],
+            'pages': conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0],
+            'without_pages': conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE id NOT IN (SELECT document_id FROM pages)"
+            ).fetchone()[0],
+            'not_searchable': conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE id NOT IN (SELECT rowid FROM document_search)"
+            ).fetchone()[0]
+        }
+    finally:
+        conn.close()
+
+    problems = []
+    if report['integrity'] != 'ok':
+        problems.append(f"integrity check: {report['integrity']}")
+    if not report['documents']:
+        problems.append("no documents indexed")
+    if report['without_pages']:
+        problems.append(f"{report['without_pages']} documents without pages")
+    if report['not_searchable']:
+        problems.append(f"{report['not_searchable']} documents missing from the search index")
+    if problems:
+        raise RuntimeError("; ".join(problems))
+
+    write_file_atomic(report_path, json.dumps(report, indent=2) + "\n")
+    print(f"  Verified {report['documents']} documents, {report['pages']} pages")
+    return report
+
+def pipeline_graph(state_path=DEFAULT_STATE_PATH, documents_dir="documents",
+                   text_dir="documents/official", pdf_dir="documents/official",
+                   convert_pool=None, cache_dir=DEFAULT_CACHE_DIR, collect_workers=4):
+    """The library build graph plus collection, verification and packaging.
+
+    collect runs alongside the conversions, verify and asset both follow
+    index, and package waits for both. The collector and the APK builder
+    depend on their own scripts, so editing either reruns its stage. Their
+    outputs are never restored from the cache.
+    """
+    from apk_build_simulator import APKBuildSimulator, release_dir
+    from comprehensive_document_collector import BahaiResourceCollector
+
+    graph = library_graph(state_path, documents_dir, text_dir, pdf_dir, convert_pool, cache_dir)
+    scripts_dir = Path(__file__).resolve().parent
+    db_path = graph.nodes['index'].outputs[0]
+    hash_path = graph.nodes['asset'].outputs[0]
+    report_path = Path(documents_dir) / VERIFY_REPORT_NAME
+
+    def collect_action(changed, removed):
+        collector = BahaiResourceCollector(documents_dir)
+        collector.collect_all_documents(max_workers=collect_workers)
+
+    # The collector writes many files besides its summary, so a cached
+    # summary must never stand in for a run
+    graph.add(BuildNode('collect', 'collect', 1,
+                        [scripts_dir / "comprehensive_document_collector.py"],
+                        [Path(documents_dir) / "COLLECTION_SUMMARY.md"], collect_action,
+                        cacheable=False))
+
+    graph.add(BuildNode('verify', 'verify', 1, [db_path], [report_path],
+                        lambda changed, removed: verify_database(db_path, report_path)))
+
+    # The builder creates its release directory, so it is only made when packaging
+    releases_dir = release_dir(".")
+
+    def package_action(changed, removed):
+        APKBuildSimulator(".").build_release()
+
+    graph.add(BuildNode('package', 'package', 1,
+                        [scripts_dir / "apk_build_simulator.py", db_path, hash_path, report_path],
+                        [releases_dir / "apk_metadata.json", releases_dir / "INSTALLATION_GUIDE.md"],
+                        package_action, cacheable=False))
+    return graph
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description='Run the library build: ' + ' -> '.join(STAGES) + ' (only what changed)')
+    parser.add_argument('--from', dest='from_stage', choices=STAGES, default=STAGES[0],
+                        help='First stage to run (earlier outputs are used as they are)')
+    parser.add_argument('--until', dest='until_stage', choices=STAGES, default=STAGES[-1],
+                        help='Last stage to run')
+    parser.add_argument('--documents-dir', default='documents')
+    parser.add_argument('--text-dir', default='documents/official',
+                        help='Text files converted to PDF')
+    parser.add_argument('--pdf-dir', default='documents/official',
+                        help='Where converted PDFs are written')
+    parser.add_argument('--state', default=DEFAULT_STATE_PATH, help='Build state file')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Where stage outputs are cached for reuse')
+    parser.add_argument('--no-cache', action='store_true', help='Do not reuse or keep cached outputs')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Stages built in parallel (conversions use worker processes)')
+    parser.add_argument('--force', action='store_true', help='Rebuild every selected stage')
+    parser.add_argument('--dry-run', action='store_true', help='List out-of-date steps and exit')
+    add_instrumentation_arguments(parser)
+
+    args = parser.parse_args()
+    first, last = STAGES.index(args.from_stage), STAGES.index(args.until_stage)
+    if first > last:
+        parser.error(f"--from {args.from_stage} comes after --until {args.until_stage}")
+    stages = set(STAGES[first:last + 1])
+
+    print("Bahai Library Pipeline")
+    print("=" * 40)
+    print(f"Stages: {' -> '.join(STAGES[first:last + 1])}\n")
+
+    pool = None
+    if args.workers > 1 and 'convert' in stages and not args.dry_run:
+        from text_to_pdf_converter import init_worker
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                   initargs=(args.text_dir, args.pdf_dir))
+    try:
+        graph = pipeline_graph(args.state, args.documents_dir, args.text_dir, args.pdf_dir, pool,
+                               None if args.no_cache else args.cache_dir)
+        if args.dry_run:
+            stale = graph.stale_nodes(stages)
+            print(f"{len(stale)} of {len(graph.nodes)} steps out of date")
+            for name in stale:
+                print(f"  {name}")
+            return
+
+        configure_from_args(args)
+        status = graph.run(max_workers=args.workers, force=args.force, stages=stages)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        finish_instrumentation(args.trace)
+
+    counts = {}
+    for value in status.values():
+        counts[value] = counts.get(value, 0) + 1
+    print("\nPipeline summary: " + ", ".join(f"{count} {value}" for value, count in sorted(counts.items())))
+    failed = sorted(name for name, value in status.items() if value == 'failed')
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Text Normalizer
+Single-pass, streaming cleanup of plain text shared by the converter and processor
+"""
+
+import mmap
+import os
+from contextlib import contextmanager
+
+# Lines at least this long are never taken for headings
+HEADING_MAX_LENGTH = 100
+
+def _split_lines(buffer, newline, carriage_return):
+    # \r\n and a lone \r both end a line, as with universal newlines
+    start = 0
+    end = len(buffer)
+    while start < end:
+        stop = buffer.find(newline, start)
+        if stop < 0:
+            stop = end
+        line = buffer[start:stop]
+        start = stop + 1
+        if line.endswith(carriage_return):
+            line = line[:-1]
+        yield from line.split(carriage_return)
+
+def iter_lines(source, encoding='utf-8', errors='strict'):
+    """Lines of a string, bytes, mmap or text file, without line endings.
+
+    Bytes are decoded one line at a time, so a mapped file is never
+    decoded (or copied) as a whole.
+    """
+    if isinstance(source, str):
+        yield from _split_lines(source, '\n', '\r')
+    elif isinstance(source, (bytes, bytearray, mmap.mmap)):
+        for line in _split_lines(source, b'\n', b'\r'):
+            yield line.decode(encoding, errors)
+    else:
+        for line in source:
+            yield line.rstrip('\r\n')
+
+@contextmanager
+def mapped_lines(path, encoding='utf-8', errors='strict'):
+    """Lines of a file read through a read-only mmap"""
+    with open(path, 'rb') as f:
+        # Empty files cannot be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            yield iter(())
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield iter_lines(mapped, encoding, errors)
+
+def iter_blocks(lines):
+    """Runs of non-blank lines (stripped), split at blank lines"""
+    block = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def is_heading(line):
+    """Short lines, or upper-case ones, are taken for headings"""
+    return len(line) < HEADING_MAX_LENGTH and (line.isupper() or line.count(' ') < 4)
+
+def iter_paragraphs(lines):
+    """('heading' | 'paragraph', text) items, produced as the lines are read"""
+    for block in iter_blocks(lines):
+        paragraph = []
+        for line in block:
+            if is_heading(line):
+                if paragraph:
+                    yield ('paragraph', " ".join(paragraph))
+                    paragraph = []
+                yield ('heading', line)
+            else:
+                paragraph.append(line)
+        if paragraph:
+            yield ('paragraph', " ".join(paragraph))
+
+def clean_text(text):
+    """Collapse whitespace and drop page furniture (page numbers, URLs, scraps)"""
+    if not text:
+        return ""
+    text = " ".join(text.split())
+    if len(text) < 3 or text.isdecimal():
+        return ""
+    lowered = text.lower()
+    if 'www.' in lowered or 'http' in lowered:
+        return ""
+    return text
@@ -6,19 +6,131 @@ Converts text files to properly formatted PDF documents
 
 import os
 import json
-from pathlib import Path
+import argparse
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path, PurePosixPath
+from reportlab import rl_config
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.units import inch
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.colors import black, darkblue
 from io import BytesIO
 import textwrap
-import re
+
+from db_connection import connect
+from download_sink import write_file_atomic
+from text_normalizer import iter_lines, iter_paragraphs, mapped_lines
+
+# Bump when a change to rendering makes existing PDFs stale
+CONVERTER_VERSION = 1
+
+# Flowables generated ahead of the one ReportLab is laying out
+STORY_LOOKAHEAD = 256
+
+DEFAULT_DB_PATH = "android-app/app/src/main/assets/database/bahai_documents.db"
+
+# Output profiles: extra BaseDocTemplate settings. Every style uses one of
+# the standard 14 fonts, which PDF viewers supply, so no font is embedded
+# and there is nothing to subset; each font is written once per document.
+PDF_PROFILES = {
+    'standard': {},
+    'compact': {
+        # Flate-compress page content streams (ReportLab's default, made explicit)
+        'pageCompression': 1,
+        # Empty document info instead of ReportLab's placeholders
+        'title': '',
+        'author': '',
+        'subject': '',
+        'creator': '',
+        'producer': ''
+    }
+}
+
+# ReportLab settings that only exist globally, swapped in while a profile renders
+PROFILE_RL_CONFIG = {
+    'compact': {
+        # Leave compressed streams binary; ASCII85 makes them a quarter larger
+        'useA85': 0
+    }
+}
+
+@contextmanager
+def rl_config_overrides(overrides):
+    """Temporarily change ReportLab's global settings (not thread-safe)"""
+    saved = {name: getattr(rl_config, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(rl_config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(rl_config, name, value)
+
+class FlowableStream:
+    """List-like story that generates its flowables on demand.
+    
+    doc.build() consumes its story from the front, deleting each flowable
+    as it is laid out and pushing split remainders back; on a list every
+    deletion shifts the rest, which is quadratic for long works, and the
+    whole story has to exist before the first page is drawn. This keeps at
+    most `lookahead` flowables in a deque and pulls more from the generator
+    as the front is consumed, supporting just the operations build() uses.
+    """
+    
+    def __init__(self, flowables, lookahead=STORY_LOOKAHEAD):
+        self.source = iter(flowables)
+        self.buffer = deque()
+        self.lookahead = lookahead
+        self.exhausted = False
+    
+    def fill(self):
+        while not self.exhausted and len(self.buffer) < self.lookahead:
+            try:
+                self.buffer.append(next(self.source))
+            except StopIteration:
+                self.exhausted = True
+    
+    def __len__(self):
+        # Only the buffered flowables count; enough for build()'s loop test
+        self.fill()
+        return len(self.buffer)
+    
+    def __getitem__(self, index):
+        self.fill()
+        if isinstance(index, slice):
+            return list(self.buffer)[index]
+        return self.buffer[index]
+    
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self.buffer))
+            if start != 0 or step != 1:
+                raise TypeError("FlowableStream only deletes from the front")
+            for _ in range(stop):
+                self.buffer.popleft()
+        else:
+            del self.buffer[index]
+    
+    def __setitem__(self, index, values):
+        # build() only ever does flowables[0:0] = split_parts
+        if not (isinstance(index, slice) and not index.start and index.stop == 0):
+            raise TypeError("FlowableStream only inserts at the front")
+        self.buffer.extendleft(reversed(list(values)))
+    
+    def insert(self, index, value):
+        self.buffer.insert(index, value)
 
 class BahaiTextToPDFConverter:
-    def __init__(self, input_dir: str = "documents/official", output_dir: str = "documents/official"):
+    def __init__(self, input_dir: str = "documents/official", output_dir: str = "documents/official",
+                 profile: str = "standard"):
+        if profile not in PDF_PROFILES:
+            raise ValueError(f"Unknown PDF profile: {profile} (choose from {', '.join(PDF_PROFILES)})")
+        self.profile = profile
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
@@ -68,6 +180,35 @@ class BahaiTextToPDFConverter:
             alignment=0,
             fontName='Times-Italic'
         )
+        
+        self.heading_style = ParagraphStyle(
+            'BahaiHeading',
+            parent=self.styles['Heading2'],
+            fontSize=13,
+            spaceAfter=15,
+            spaceBefore=20,
+            alignment=0,
+            textColor=darkblue,
+            fontName='Helvetica-Bold'
+        )
+        
+        # Page layout shared by every document this converter renders
+        self.page_size = A4
+        self.margins = {
+            'rightMargin': 0.75*inch,
+            'leftMargin': 0.75*inch,
+            'topMargin': 1*inch,
+            'bottomMargin': 0.75*inch
+        }
+        page_width, page_height = self.page_size
+        frame = Frame(self.margins['leftMargin'], self.margins['bottomMargin'],
+                      page_width - self.margins['leftMargin'] - self.margins['rightMargin'],
+                      page_height - self.margins['topMargin'] - self.margins['bottomMargin'],
+                      id='normal')
+        self.page_templates = [PageTemplate(id='Body', frames=[frame], pagesize=self.page_size)]
+        
+        # None builds the whole story as a list before rendering
+        self.story_lookahead = STORY_LOOKAHEAD
     
     def load_metadata(self, text_file: Path) -> dict:
         """Load metadata from JSON file"""
@@ -79,145 +220,350 @@ class BahaiTextToPDFConverter:
     
     def clean_and_format_text(self, text: str) -> list:
         """Clean and format text into structured paragraphs"""
-        # Remove extra whitespace and normalize line endings
-        text = re.sub(r'\r\n', '\n', text)
-        text = re.sub(r'\r', '\n', text)
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        
-        paragraphs = []
-        current_paragraph = ""
-        
-        for line in text.split('\n'):
-            line = line.strip()
-            
-            if not line:  # Empty line
-                if current_paragraph:
-                    paragraphs.append(('paragraph', current_paragraph.strip()))
-                    current_paragraph = ""
-                continue
-            
-            # Check if this line looks like a heading
-            if len(line) < 100 and (line.isupper() or line.count(' ') < 4):
-                if current_paragraph:
-                    paragraphs.append(('paragraph', current_paragraph.strip()))
-                    current_paragraph = ""
-                paragraphs.append(('heading', line))
-            else:
-                # Add to current paragraph
-                if current_paragraph:
-                    current_paragraph += " " + line
-                else:
-                    current_paragraph = line
-        
-        # Don't forget the last paragraph
-        if current_paragraph:
-            paragraphs.append(('paragraph', current_paragraph.strip()))
-        
-        return paragraphs
+        return list(self.iter_paragraphs(iter_lines(text)))
+    
+    def iter_paragraphs(self, lines):
+        """Group lines into ('heading' | 'paragraph', text) items as they are read"""
+        return iter_paragraphs(lines)
     
     def create_pdf_from_text(self, text_file: Path) -> Path:
         """Convert a text file to PDF"""
         print(f"Converting {text_file.name} to PDF...")
+        pdf_file, page_count = self.render_pdf(text_file)
+        print(f"Created PDF: {pdf_file.name}")
+        return pdf_file
+    
+    def render_pdf(self, text_file: Path):
+        """Render a text file to PDF; returns (pdf_file, page_count).
         
-        # Load text content
-        with open(text_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
+        The PDF is built in memory with ReportLab's invariant mode (no
+        timestamps or random document IDs) and written atomically, so the
+        same input always yields the same bytes and a failed conversion
+        never leaves a truncated PDF behind.
+        """
         # Load metadata
         metadata = self.load_metadata(text_file)
         
         # Create PDF file path
         pdf_file = self.output_dir / text_file.name.replace('.txt', '.pdf')
         
-        # Create PDF document
-        doc = SimpleDocTemplate(
-            str(pdf_file),
-            pagesize=A4,
-            rightMargin=0.75*inch,
-            leftMargin=0.75*inch,
-            topMargin=1*inch,
-            bottomMargin=0.75*inch
+        # The mapped text is read line by line while the story is laid out
+        with mapped_lines(text_file) as lines:
+            page_count = self.build_pdf(pdf_file, metadata, lines)
+        
+        return pdf_file, page_count
+    
+    def render_document(self, conn, document_id: int, pdf_name: str = None):
+        """Render an indexed document from the database; returns (pdf_file, page_count).
+        
+        The cleaned page rows are streamed from the cursor into the story,
+        so only the rows ReportLab is laying out are held in memory. PDFs
+        go to output_dir/pdf_name, by default the name export_file_names()
+        gives the document.
+        """
+        row = conn.execute(
+            "SELECT title, author, category, description, file_path FROM documents WHERE id = ?",
+            (document_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No document with id {document_id}")
+        title, author, category, description, file_path = row
+        metadata = {'title': title, 'author': author, 'description': description}
+        
+        pdf_file = self.output_dir / (pdf_name or export_file_names(conn)[document_id])
+        pdf_file.parent.mkdir(parents=True, exist_ok=True)
+        page_count = self.build_pdf(pdf_file, metadata, self.iter_page_lines(conn, document_id))
+        return pdf_file, page_count
+    
+    def iter_page_lines(self, conn, document_id: int):
+        """Page texts of an indexed document, each followed by a paragraph break"""
+        cursor = conn.execute(
+            "SELECT page_text FROM pages WHERE document_id = ? ORDER BY page_number",
+            (document_id,)
         )
+        for (page_text,) in cursor:
+            yield page_text
+            yield ''
+    
+    def build_pdf(self, pdf_file: Path, metadata: dict, lines) -> int:
+        """Lay out a document from its metadata and text lines; returns the page count"""
+        # Create PDF document from the converter's shared page templates
+        buffer = BytesIO()
+        doc = BaseDocTemplate(
+            buffer,
+            pagesize=self.page_size,
+            pageTemplates=self.page_templates,
+            invariant=1,
+            **self.margins,
+            **PDF_PROFILES[self.profile]
+        )
+        
+        story = self.iter_story(metadata, lines)
+        if self.story_lookahead is None:
+            story = list(story)
+        else:
+            story = FlowableStream(story, self.story_lookahead)
         
-        story = []
+        # Build the PDF
+        with rl_config_overrides(PROFILE_RL_CONFIG.get(self.profile, {})):
+            doc.build(story)
+        write_file_atomic(pdf_file, buffer.getvalue())
         
+        return doc.page
+    
+    def iter_story(self, metadata: dict, lines):
+        """Flowables for a document: title page, then the text"""
         # Add title page
         if metadata.get('title'):
-            story.append(Paragraph(metadata['title'], self.title_style))
-            story.append(Spacer(1, 0.2*inch))
+            yield Paragraph(metadata['title'], self.title_style)
+            yield Spacer(1, 0.2*inch)
         
         if metadata.get('author'):
-            story.append(Paragraph(f"by {metadata['author']}", self.author_style))
-            story.append(Spacer(1, 0.3*inch))
+            yield Paragraph(f"by {metadata['author']}", self.author_style)
+            yield Spacer(1, 0.3*inch)
         
         if metadata.get('description'):
-            story.append(Paragraph(metadata['description'], self.body_style))
-            story.append(Spacer(1, 0.2*inch))
+            yield Paragraph(metadata['description'], self.body_style)
+            yield Spacer(1, 0.2*inch)
         
         # Add a page break after title page
-        story.append(PageBreak())
+        yield PageBreak()
         
         # Process the main content
-        paragraphs = self.clean_and_format_text(content)
-        
-        for para_type, para_text in paragraphs:
+        for para_type, para_text in self.iter_paragraphs(lines):
             if para_type == 'heading':
-                heading_style = ParagraphStyle(
-                    'BahaiHeading',
-                    parent=self.styles['Heading2'],
-                    fontSize=13,
-                    spaceAfter=15,
-                    spaceBefore=20,
-                    alignment=0,
-                    textColor=darkblue,
-                    fontName='Helvetica-Bold'
-                )
-                story.append(Paragraph(para_text, heading_style))
+                yield Paragraph(para_text, self.heading_style)
             elif para_type == 'paragraph':
-                # Check if it looks like a quote (indented or starts with quotation)
-                if para_text.startswith('"') or len(para_text) > 200:
-                    story.append(Paragraph(para_text, self.body_style))
-                else:
-                    story.append(Paragraph(para_text, self.body_style))
+                yield Paragraph(para_text, self.body_style)
             
-            story.append(Spacer(1, 0.1*inch))
-        
-        # Build the PDF
-        doc.build(story)
-        
-        print(f"Created PDF: {pdf_file.name}")
-        return pdf_file
+            # Flowables are never shared: ReportLab marks them during layout
+            yield Spacer(1, 0.1*inch)
     
-    def convert_all_text_files(self):
-        """Convert all text files to PDFs"""
-        text_files = list(self.input_dir.glob('*.txt'))
+    def convert_all_text_files(self, workers: int = None):
+        """Convert all text files to PDFs.
+        
+        Files are rendered in a pool of worker processes (one per CPU by
+        default; workers=1 converts in this process). A failing file is
+        reported and skipped without affecting the others. Per-file timings
+        are kept in self.conversion_results, in file name order.
+        """
+        text_files = sorted(self.input_dir.glob('*.txt'))
         
         if not text_files:
             print("No text files found to convert")
             return []
         
-        print(f"Found {len(text_files)} text files to convert...")
+        workers = min(workers or os.cpu_count() or 1, len(text_files))
+        print(f"Found {len(text_files)} text files to convert ({workers} worker processes)...")
         
-        pdf_files = []
-        for text_file in text_files:
-            try:
-                pdf_file = self.create_pdf_from_text(text_file)
-                pdf_files.append(pdf_file)
-            except Exception as e:
-                print(f"Error converting {text_file.name}: {e}")
+        started = time.perf_counter()
+        results = {}
+        if workers == 1:
+            for text_file in text_files:
+                results[text_file] = convert_file(self, text_file)
+                report_conversion(results[text_file])
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                     initargs=(str(self.input_dir), str(self.output_dir), self.profile)) as executor:
+                futures = {executor.submit(convert_in_worker, text_file): text_file
+                           for text_file in text_files}
+                for future in as_completed(futures):
+                    text_file = futures[future]
+                    try:
+                        results[text_file] = future.result()
+                    except Exception as e:
+                        # The worker itself died (e.g. out of memory)
+                        results[text_file] = {'file': text_file.name, 'pdf': None, 'pages': 0, 'bytes': 0,
+                                              'seconds': 0.0, 'error': f"{e.__class__.__name__}: {e}"}
+                    report_conversion(results[text_file])
+        elapsed = time.perf_counter() - started
         
-        print(f"\nConversion complete! Created {len(pdf_files)} PDF files.")
-        return pdf_files
+        self.conversion_results = [results[text_file] for text_file in text_files]
+        return report_summary("Conversion", self.profile, self.conversion_results, elapsed)
+    
+    def export_documents(self, db_path: str = DEFAULT_DB_PATH, categories=None,
+                         document_ids=None, workers: int = None):
+        """Regenerate PDFs straight from the indexed pages, without re-extracting.
+        
+        Exports the given documents, or every document in the given
+        categories (everything when neither is given). Like
+        convert_all_text_files, documents are rendered in a pool of worker
+        processes, each with its own read-only database connection, and
+        failures are reported without stopping the batch. Per-document
+        timings are kept in self.export_results, in id order.
+        """
+        conn = connect(db_path, read_only=True)
+        try:
+            query = "SELECT id, title FROM documents"
+            clauses, parameters = [], []
+            if categories:
+                clauses.append(f"category IN ({', '.join('?' * len(categories))})")
+                parameters.extend(categories)
+            if document_ids:
+                clauses.append(f"id IN ({', '.join('?' * len(document_ids))})")
+                parameters.extend(document_ids)
+            if clauses:
+                query += " WHERE " + " OR ".join(clauses)
+            documents = conn.execute(query + " ORDER BY id", parameters).fetchall()
+            
+            if not documents:
+                print("No matching documents found to export")
+                return []
+            
+            pdf_names = export_file_names(conn)
+            workers = min(workers or os.cpu_count() or 1, len(documents))
+            print(f"Exporting {len(documents)} documents from {db_path} ({workers} worker processes)...")
+            
+            started = time.perf_counter()
+            results = {}
+            if workers == 1:
+                for document_id, title in documents:
+                    results[document_id] = export_document(self, conn, document_id, title,
+                                                           pdf_names[document_id])
+                    report_conversion(results[document_id])
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=init_export_worker,
+                                         initargs=(str(db_path), str(self.output_dir), self.profile)) as executor:
+                    futures = {executor.submit(export_in_worker, document_id, title,
+                                               pdf_names[document_id]): (document_id, title)
+                               for document_id, title in documents}
+                    for future in as_completed(futures):
+                        document_id, title = futures[future]
+                        try:
+                            results[document_id] = future.result()
+                        except Exception as e:
+                            # The worker itself died (e.g. out of memory)
+                            results[document_id] = {'file': title, 'pdf': None, 'pages': 0, 'bytes': 0,
+                                                    'seconds': 0.0, 'error': f"{e.__class__.__name__}: {e}"}
+                        report_conversion(results[document_id])
+            elapsed = time.perf_counter() - started
+        finally:
+            conn.close()
+        
+        self.export_results = [results[document_id] for document_id, _ in documents]
+        return report_summary("Export", self.profile, self.export_results, elapsed)
+
+def timed_render(label, render, *args):
+    """Run one render call, capturing its timing and any error"""
+    started = time.perf_counter()
+    try:
+        pdf_file, page_count = render(*args)
+        return {'file': label, 'pdf': str(pdf_file), 'pages': page_count,
+                'bytes': pdf_file.stat().st_size,
+                'seconds': time.perf_counter() - started, 'error': None}
+    except Exception as e:
+        return {'file': label, 'pdf': None, 'pages': 0, 'bytes': 0,
+                'seconds': time.perf_counter() - started, 'error': f"{e.__class__.__name__}: {e}"}
+
+def convert_file(converter, text_file):
+    """Convert one file, capturing its timing and any error"""
+    return timed_render(text_file.name, converter.render_pdf, text_file)
+
+def export_file_names(conn):
+    """Output path for every indexed document: <category>/<source file stem>.pdf.
+    
+    Documents that would share a path (foo.txt and foo.pdf in one category,
+    or same-named files from different folders) get their id appended to
+    the stem instead, so no export overwrites another. Names depend on the
+    whole database, not on which documents are exported.
+    """
+    stems = {}
+    for document_id, category, file_path in conn.execute(
+            "SELECT id, category, file_path FROM documents"):
+        # Databases built on Windows store backslash-separated paths
+        stems[document_id] = (category, Path(file_path.replace('\\', '/')).stem)
+    # Compared case-insensitively, as the file system may be
+    counts = Counter((category, stem.lower()) for category, stem in stems.values())
+    names = {}
+    for document_id, (category, stem) in stems.items():
+        if counts[(category, stem.lower())] > 1:
+            stem = f"{stem}-{document_id}"
+        names[document_id] = str(PurePosixPath(category) / f"{stem}.pdf")
+    return names
+
+def export_document(converter, conn, document_id, title, pdf_name=None):
+    """Export one indexed document, capturing its timing and any error"""
+    return timed_render(title, converter.render_document, conn, document_id, pdf_name)
+
+def report_conversion(result):
+    if result['error']:
+        print(f"  Error converting {result['file']}: {result['error']}")
+    else:
+        print(f"  {result['file']}: {result['pages']} pages, {result['bytes'] / 1024:.1f} KB "
+              f"({result['bytes'] // max(result['pages'], 1)} bytes/page) in {result['seconds']:.2f}s")
+
+def report_summary(action, profile, results, elapsed):
+    """Print totals for a batch of render results; returns the PDFs created"""
+    pdf_files = [Path(result['pdf']) for result in results if result['pdf']]
+    failed = len(results) - len(pdf_files)
+    render_seconds = sum(result['seconds'] for result in results)
+    total_bytes = sum(result['bytes'] for result in results)
+    total_pages = sum(result['pages'] for result in results)
+    
+    print(f"\n{action} complete! Created {len(pdf_files)} PDF files"
+          f"{f', {failed} failed' if failed else ''} in {elapsed:.2f}s "
+          f"({render_seconds:.2f}s of rendering).")
+    if total_pages:
+        print(f"Profile '{profile}': {total_pages} pages, {total_bytes / 1024:.1f} KB, "
+              f"{total_bytes // total_pages} bytes/page, "
+              f"{render_seconds * 1000 / total_pages:.1f} ms/page")
+    return pdf_files
+
+# Each worker process builds its converter (and styles) once
+_worker_converter = None
+
+def init_worker(input_dir, output_dir, profile='standard'):
+    global _worker_converter
+    _worker_converter = BahaiTextToPDFConverter(input_dir, output_dir, profile)
+
+def convert_in_worker(text_file):
+    return convert_file(_worker_converter, text_file)
+
+# Export workers also keep one read-only connection each
+_worker_connection = None
+
+def init_export_worker(db_path, output_dir, profile='standard'):
+    global _worker_converter, _worker_connection
+    _worker_converter = BahaiTextToPDFConverter(output_dir=output_dir, profile=profile)
+    _worker_connection = connect(db_path, read_only=True)
+
+def export_in_worker(document_id, title, pdf_name=None):
+    return export_document(_worker_converter, _worker_connection, document_id, title, pdf_name)
 
 def main():
     """Main function"""
-    converter = BahaiTextToPDFConverter()
+    parser = argparse.ArgumentParser(description='Convert Bahai text files to PDF')
+    parser.add_argument('--input-dir', default='documents/official',
+                       help='Directory containing text files')
+    parser.add_argument('--output-dir',
+                       help='Directory for the generated PDFs '
+                            '(default: documents/official, or documents/exports with --from-db)')
+    parser.add_argument('--workers', type=int,
+                       help='Worker processes (default: one per CPU, 1 = no pool)')
+    parser.add_argument('--profile', choices=sorted(PDF_PROFILES), default='standard',
+                       help='Output profile (compact: binary compressed streams, no document info)')
+    parser.add_argument('--from-db', nargs='?', const=DEFAULT_DB_PATH, metavar='DB',
+                       help='Export indexed documents from the database instead of text files')
+    parser.add_argument('--category', action='append',
+                       help='With --from-db: export this category (repeatable)')
+    parser.add_argument('--document-id', type=int, action='append',
+                       help='With --from-db: export this document (repeatable)')
+    
+    args = parser.parse_args()
+    
+    output_dir = args.output_dir or ('documents/exports' if args.from_db else 'documents/official')
+    converter = BahaiTextToPDFConverter(args.input_dir, output_dir, args.profile)
     
     print("Bahai Text to PDF Converter")
     print("=" * 40)
-    print("Converting text files to properly formatted PDFs...\n")
     
-    pdf_files = converter.convert_all_text_files()
+    if args.from_db:
+        print("Exporting indexed documents to PDF...\n")
+        pdf_files = converter.export_documents(args.from_db, categories=args.category,
+                                               document_ids=args.document_id, workers=args.workers)
+    else:
+        print("Converting text files to properly formatted PDFs...\n")
+        pdf_files = converter.convert_all_text_files(workers=args.workers)
     
     if pdf_files:
         print("\nCreated PDF files:")
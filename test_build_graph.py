@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the incremental build graph
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from build_graph import library_graph
+from db_connection import connect
+from document_store import hash_file
+from metadata_store import MetadataStore
+
+DB_PATH = "android-app/app/src/main/assets/database/bahai_documents.db"
+
+def write_library(root):
+    documents_dir = root / "documents"
+    (documents_dir / "confirmed-official").mkdir(parents=True)
+    (documents_dir / "pending-permissions").mkdir()
+    (root / "text").mkdir()
+    (documents_dir / "confirmed-official" / "unity.txt").write_text(
+        "The Oneness of Mankind\n\nThe earth is but one country, and mankind its citizens.\n",
+        encoding='utf-8')
+    (documents_dir / "document_metadata.json").write_text(json.dumps({'documents': {}}),
+                                                           encoding='utf-8')
+    return documents_dir
+
+def run_graph(root):
+    graph = library_graph(root / "build_state.json", root / "documents", root / "text", root / "text")
+    return graph.run(max_workers=1)
+
+def page_texts():
+    conn = connect(DB_PATH, read_only=True)
+    try:
+        return [row[0] for row in conn.execute("SELECT page_text FROM pages ORDER BY id")]
+    finally:
+        conn.close()
+
+def test_version_change_reindexes_everything(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_library(tmp_path)
+    assert run_graph(tmp_path)['index'] == 'built'
+    pages = page_texts()
+    assert pages
+
+    # Damage the index, then pretend it was built by an older processor
+    conn = connect(DB_PATH)
+    conn.execute("UPDATE pages SET page_text = 'stale'")
+    conn.commit()
+    conn.close()
+    state_path = tmp_path / "build_state.json"
+    state = json.loads(state_path.read_text(encoding='utf-8'))
+    state['nodes']['index']['version'] -= 1
+    # Record the damaged database as the output, so only the version differs
+    state['nodes']['index']['outputs'] = {DB_PATH: hash_file(DB_PATH)}
+    state_path.write_text(json.dumps(state), encoding='utf-8')
+
+    assert run_graph(tmp_path)['index'] == 'built'
+    assert page_texts() == pages
+
+def test_metadata_store_change_reindexes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents_dir = write_library(tmp_path)
+    assert run_graph(tmp_path)['index'] == 'built'
+    assert run_graph(tmp_path)['index'] == 'up-to-date'
+
+    # Writers such as the ingest pipeline commit to the store without exporting the JSON
+    store = MetadataStore(documents_dir / "document_metadata.db", documents_dir / "document_metadata.json")
+    store.put("https://bahai.org/unity", {'title': 'Unity of Mankind', 'author': 'Bahaullah',
+                                          'category': 'Holy Text',
+                                          'filepath': 'confirmed-official/unity.txt'})
+    store.close()
+
+    assert run_graph(tmp_path)['index'] == 'built'
+    conn = connect(DB_PATH, read_only=True)
+    try:
+        assert conn.execute("SELECT title FROM documents").fetchall() == [('Unity of Mankind',)]
+    finally:
+        conn.close()
@@ -3,10 +3,13 @@
 Quick test of the Bahai Resource Library database
 """
 
-import sqlite3
 import os
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from db_connection import connect
+
 def test_database():
     # Find the database
     db_path = Path("android-app/app/src/main/assets/database/bahai_documents.db")
@@ -15,7 +18,7 @@ def test_database():
         print("❌ Database not found at:", db_path)
         return
     
-    conn = sqlite3.connect(str(db_path))
+    conn = connect(db_path, read_only=True)
     cursor = conn.cursor()
     
     print("=== BAHAI RESOURCE LIBRARY DATABASE TEST ===")
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Tests for the resumable document collection
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from comprehensive_document_collector import BahaiResourceCollector
+
+def test_stale_state_entries_are_dropped(tmp_path):
+    collector = BahaiResourceCollector(tmp_path / "documents")
+    collector.state_file.write_text(json.dumps({
+        'pending': {'gone/Old Title': {'url': None, 'priority': 1, 'host': ''}},
+        'done': {},
+        'failed': {'gone/Another Title': 'no result'}
+    }), encoding='utf-8')
+
+    collected_files, _ = collector.collect_all_documents(max_workers=2)
+
+    assert len(collected_files) == len(collector.document_catalog)
+    # Nothing is left over, so the state is cleared
+    assert not collector.state_file.exists()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Tests for the document processor
+"""
+
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+import document_processor
+from document_processor import BahaiDocumentProcessor
+
+def small_pdf(lines):
+    canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, invariant=1)
+    for line in lines:
+        pdf.drawString(72, 720, line)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def test_extract_text_from_pdf_bytes(tmp_path, monkeypatch):
+    if not (document_processor.HAS_PDFPLUMBER or document_processor.HAS_PYPDF2):
+        pytest.skip("no PDF library installed")
+    monkeypatch.chdir(tmp_path)
+    processor = BahaiDocumentProcessor(tmp_path / "documents")
+    data = small_pdf(["The earth is but one country", "and mankind its citizens"])
+
+    pages = processor.extract_text_from_bytes(data, '.pdf')
+
+    assert [page['page'] for page in pages] == [1, 2]
+    assert pages[0]['text'] == "The earth is but one country"
+    assert pages[1]['word_count'] == 4
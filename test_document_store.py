@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed document store
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from document_store import ContentStore
+
+def test_stores_sharing_a_manifest_keep_each_others_entries(tmp_path):
+    store_dir = tmp_path / "documents" / ".store"
+    downloader = ContentStore(store_dir)
+    processor = ContentStore(store_dir)
+
+    downloader.write(tmp_path / "documents" / "official" / "aqdas.txt", "The Most Holy Book")
+    processor.write(tmp_path / "documents" / "official" / "iqan.txt", "The Book of Certitude")
+    downloader.save()
+    processor.save()
+
+    manifest = json.loads((store_dir / "manifest.json").read_text(encoding='utf-8'))
+    assert sorted(manifest['paths']) == ["official/aqdas.txt", "official/iqan.txt"]
+    assert not list(store_dir.glob("*.tmp"))
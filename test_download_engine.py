@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for retries, backoff and rate limiting in the download engine
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from download_engine import CircuitBreaker, DownloadResilience, HostRateLimiter, RetryPolicy
+
+URL = "https://reference.bahai.org/en/t/b/HW/hw-1.html"
+
+class CountingLimiter(HostRateLimiter):
+    def __init__(self):
+        super().__init__(rate=1000.0)
+        self.acquired = []
+
+    def acquire(self, host):
+        self.acquired.append(host)
+        super().acquire(host)
+
+def flaky(failures):
+    """A call that fails with a connection error `failures` times, then succeeds"""
+    remaining = [failures]
+
+    def call():
+        if remaining[0]:
+            remaining[0] -= 1
+            raise requests.ConnectionError("connection reset")
+        return 'ok'
+    return call
+
+def resilience(budget, refill_ratio=0.5):
+    policy = RetryPolicy(max_attempts=3, base_delay=0, budget=budget, refill_ratio=refill_ratio)
+    return DownloadResilience(policy, CircuitBreaker(failure_threshold=100))
+
+def test_retries_wait_on_the_host_limiter():
+    limiter = CountingLimiter()
+    assert resilience(budget=5).call(URL, flaky(2), limiter) == 'ok'
+    # The first attempt is limited by the caller; each retry by the resilience layer
+    assert limiter.acquired == ['reference.bahai.org'] * 2
+
+def test_retry_budget_is_refilled_by_successes():
+    layer = resilience(budget=1)
+    assert layer.call(URL, flaky(1)) == 'ok'
+    with pytest.raises(requests.ConnectionError):
+        layer.call(URL, flaky(1))
+
+    # Two successes at refill_ratio 0.5 earn back one retry
+    layer.call(URL, flaky(0))
+    layer.call(URL, flaky(0))
+    assert layer.call(URL, flaky(1)) == 'ok'
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for downloads against a local fixture server
+"""
+
+import hashlib
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+import http_fixtures
+from document_downloader import BahaiDocumentDownloader
+from download_sink import ResumableFileSink
+from official_document_downloader import OfficialBahaiDownloader
+from http_fixtures import Cassette, FixtureServer, SYNTHETIC_LAST_MODIFIED
+
+DOCUMENT_URL = "https://www.bahai.org/library/authoritative-texts/hidden-words.pdf"
+DOCUMENT_BODY = b"%PDF-1.4 The Hidden Words " * 2000
+DOCUMENT_ETAG = '"hidden-words-1"'
+
+class RecordingServer(FixtureServer):
+    """Fixture server that keeps the headers of every request it answers"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def handle(self, handler):
+        with self.lock:
+            self.requests.append(dict(handler.headers))
+        super().handle(handler)
+
+class DropFirstServer(RecordingServer):
+    """Closes the connection half way through the first response for each URL"""
+
+    def fault_for(self, url):
+        with self.lock:
+            self.attempts[url] += 1
+            return 'drop' if self.attempts[url] == 1 else None
+
+def document_cassette(body=DOCUMENT_BODY, etag=DOCUMENT_ETAG):
+    cassette = Cassette()
+    cassette.add(DOCUMENT_URL, body, headers={
+        'Content-Type': 'application/pdf',
+        'ETag': etag,
+        'Last-Modified': SYNTHETIC_LAST_MODIFIED
+    })
+    return cassette
+
+def test_unchanged_document_is_revalidated_not_downloaded(tmp_path):
+    with RecordingServer(document_cassette()) as server:
+        downloader = BahaiDocumentDownloader(tmp_path / "documents")
+        http_fixtures.install(downloader.session, server)
+
+        path = downloader.download_document(DOCUMENT_URL, "The Hidden Words", "Bahaullah", "Holy Text")
+        assert path.read_bytes() == DOCUMENT_BODY
+        before = path.stat()
+        entry = downloader.metadata_store.get(DOCUMENT_URL)
+
+        again = downloader.download_document(DOCUMENT_URL, "The Hidden Words", "Bahaullah", "Holy Text")
+
+    assert again == path
+    assert len(server.requests) == 2
+    assert server.requests[1]['If-None-Match'] == DOCUMENT_ETAG
+    assert server.requests[1]['If-Modified-Since'] == SYNTHETIC_LAST_MODIFIED
+    assert server.stats['not_modified'] == 1
+
+    after = path.stat()
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    assert hashlib.sha256(path.read_bytes()).hexdigest() == entry['hash']
+    assert downloader.metadata_store.get(DOCUMENT_URL) == entry
+
+def fetch(session, url, path):
+    """One download attempt, as the downloaders make it"""
+    with ResumableFileSink(path, url) as sink:
+        response = session.get(url, stream=True, timeout=5, headers=sink.request_headers())
+        sink.start(response)
+        sink.write_response(response)
+        return sink.commit()
+
+def test_interrupted_download_resumes_with_range(tmp_path):
+    path = tmp_path / "hidden-words.pdf"
+    with DropFirstServer(document_cassette()) as server:
+        session = requests.Session()
+        http_fixtures.install(session, server)
+
+        with pytest.raises(requests.RequestException):
+            fetch(session, DOCUMENT_URL, path)
+        assert not path.exists()
+        partial = path.with_name(path.name + '.part').stat().st_size
+        assert 0 < partial < len(DOCUMENT_BODY)
+
+        fetch(session, DOCUMENT_URL, path)
+
+    assert server.requests[1]['Range'] == f"bytes={partial}-"
+    assert server.requests[1]['If-Range'] == DOCUMENT_ETAG
+    assert server.stats['partial'] == 1
+    assert hashlib.sha256(path.read_bytes()).hexdigest() == hashlib.sha256(DOCUMENT_BODY).hexdigest()
+    assert not path.with_name(path.name + '.part').exists()
+
+def test_changed_document_restarts_download(tmp_path):
+    path = tmp_path / "hidden-words.pdf"
+    new_body = b"%PDF-1.4 The Hidden Words, revised " * 2000
+    with DropFirstServer(document_cassette()) as server:
+        session = requests.Session()
+        http_fixtures.install(session, server)
+
+        with pytest.raises(requests.RequestException):
+            fetch(session, DOCUMENT_URL, path)
+        server.cassette.add(DOCUMENT_URL, new_body, headers={
+            'Content-Type': 'application/pdf',
+            'ETag': '"hidden-words-2"',
+            'Last-Modified': SYNTHETIC_LAST_MODIFIED
+        })
+
+        fetch(session, DOCUMENT_URL, path)
+
+    # The stale If-Range makes the server send the whole new document
+    assert server.requests[1]['If-Range'] == DOCUMENT_ETAG
+    assert server.stats['partial'] == 0
+    assert hashlib.sha256(path.read_bytes()).hexdigest() == hashlib.sha256(new_body).hexdigest()
+
+def test_failed_search_response_is_closed(tmp_path):
+    # An empty cassette answers the search with a 404
+    with FixtureServer(Cassette()) as server:
+        downloader = OfficialBahaiDownloader(tmp_path / "official", store_dir=tmp_path / ".store",
+                                             cache_dir=tmp_path / "search")
+        http_fixtures.install(downloader.session, server)
+        responses = []
+        get = downloader.session.get
+
+        def recording_get(*args, **kwargs):
+            responses.append(get(*args, **kwargs))
+            return responses[-1]
+        downloader.session.get = recording_get
+
+        assert downloader.search_bahai_org_library("Kitab-i-Aqdas") == []
+
+    assert [response.status_code for response in responses] == [404]
+    assert responses[0].raw.closed
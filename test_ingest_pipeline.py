@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming ingest pipeline
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+import http_fixtures
+from document_downloader import BahaiDocumentDownloader
+from document_processor import BahaiDocumentProcessor
+from http_fixtures import Cassette, FixtureServer
+from ingest_pipeline import StreamingIngestPipeline
+
+DB_PATH = "android-app/app/src/main/assets/database/bahai_documents.db"
+
+def text_document(number):
+    return {
+        'url': f"https://reference.bahai.org/en/t/b/HW/hw-{number}",
+        'title': f"The Hidden Words {number}",
+        'author': "Bahaullah",
+        'category': "Holy Text",
+        'description': ''
+    }
+
+def text_cassette(documents):
+    cassette = Cassette()
+    for doc in documents:
+        cassette.add(doc['url'], f"{doc['title']}\n\nO Son of Spirit! My first counsel is this.\n",
+                     headers={'Content-Type': 'text/plain; charset=utf-8'})
+    return cassette
+
+def make_pipeline(tmp_path, server, **options):
+    downloader = BahaiDocumentDownloader(tmp_path / "documents")
+    http_fixtures.install(downloader.session, server)
+    processor = BahaiDocumentProcessor(tmp_path / "documents", **options.pop('processor', {}))
+    return StreamingIngestPipeline(downloader, processor, rate_per_host=1000.0, **options)
+
+def test_kept_text_documents_are_saved_as_text(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    documents = [text_document(1)]
+    with FixtureServer(text_cassette(documents)) as server:
+        pipeline = make_pipeline(tmp_path, server, keep_raw=True)
+        assert pipeline.run(documents) == 1
+
+    entry = pipeline.downloader.metadata_store.get(documents[0]['url'])
+    raw_file = tmp_path / "documents" / entry['filepath']
+    assert raw_file.suffix == '.txt'
+    assert pipeline.processor.extract_text_from_file(raw_file)
+    pipeline.processor.conn.close()
+
+class SlowServer(FixtureServer):
+    """Answers one URL late, so documents finish out of input order"""
+
+    def __init__(self, cassette, slow_url):
+        super().__init__(cassette)
+        self.slow_url = slow_url
+
+    def handle(self, handler):
+        if handler.headers.get('X-Fixture-Url') == self.slow_url:
+            time.sleep(0.3)
+        super().handle(handler)
+
+def reproducible_build(root, slow):
+    root.mkdir()
+    os.chdir(root)
+    documents = [text_document(number) for number in range(1, 4)]
+    with SlowServer(text_cassette(documents), documents[slow]['url']) as server:
+        pipeline = make_pipeline(root, server, ordered=True, download_workers=3,
+                                 processor={'reproducible': True})
+        assert pipeline.run(documents) == 3
+    pipeline.processor.publish()
+    return (root / DB_PATH).read_bytes()
+
+def test_ordered_ingest_is_reproducible(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    first = reproducible_build(tmp_path / "first", slow=0)
+    second = reproducible_build(tmp_path / "second", slow=2)
+    assert first == second
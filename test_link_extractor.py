@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming link extractor
+"""
+
+import sys
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+import http_fixtures
+from http_fixtures import Cassette, FixtureServer
+from link_extractor import extract_pdf_links_from_response
+
+PAGE_URL = "https://www.bahai.org/library/authoritative-texts/"
+TITLE = "Kitáb-i-Íqán — Bahá'u'lláh"
+
+def links_served_as(body, content_type):
+    cassette = Cassette()
+    cassette.add(PAGE_URL, body, headers={'Content-Type': content_type})
+    with FixtureServer(cassette) as server:
+        session = requests.Session()
+        http_fixtures.install(session, server)
+        response = session.get(PAGE_URL, stream=True)
+        return extract_pdf_links_from_response(response)
+
+def test_utf8_page_without_charset_header():
+    body = f'<html><body><a href="/iqan.pdf">{TITLE}</a></body></html>'.encode('utf-8')
+    assert links_served_as(body, 'text/html') == [('/iqan.pdf', TITLE)]
+
+def test_meta_charset_is_used_without_header():
+    body = ('<html><head><meta charset="windows-1252"></head>'
+            '<body><a href="/hw.pdf">Bahá\'í Prayers</a></body></html>').encode('cp1252')
+    assert links_served_as(body, 'text/html') == [('/hw.pdf', "Bahá'í Prayers")]
+
+def test_header_charset_wins():
+    body = '<a href="/iqan.pdf">Kitáb-i-Íqán</a>'.encode('latin-1')
+    assert links_served_as(body, 'text/html; charset=ISO-8859-1') == [('/iqan.pdf', 'Kitáb-i-Íqán')]
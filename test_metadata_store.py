@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite document metadata store
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from metadata_store import MetadataStore
+
+def write_catalog(path, urls):
+    documents = {url: {'title': url.rsplit('/', 1)[-1], 'filepath': f"official/{url.rsplit('/', 1)[-1]}.pdf"}
+                 for url in urls}
+    path.write_text(json.dumps({'documents': documents, 'last_updated': '2026-01-01'}),
+                    encoding='utf-8')
+
+def test_import_replaces_entries(tmp_path):
+    store = MetadataStore(tmp_path / "document_metadata.db", tmp_path / "document_metadata.json")
+    store.put("https://bahai.org/aqdas", {'title': 'aqdas'})
+    store.put("https://bahai.org/iqan", {'title': 'iqan'})
+    catalog = tmp_path / "edited.json"
+    write_catalog(catalog, ["https://bahai.org/aqdas", "https://bahai.org/gleanings"])
+
+    store.import_json(catalog)
+
+    assert [url for url, _ in store.items()] == ["https://bahai.org/aqdas", "https://bahai.org/gleanings"]
+    assert store.by_filename("gleanings.pdf")['title'] == 'gleanings'
+    assert store.get_info('last_updated') == '2026-01-01'
+
+def test_import_merge_keeps_entries(tmp_path):
+    store = MetadataStore(tmp_path / "document_metadata.db", tmp_path / "document_metadata.json")
+    store.put("https://bahai.org/iqan", {'title': 'iqan'})
+    catalog = tmp_path / "edited.json"
+    write_catalog(catalog, ["https://bahai.org/gleanings"])
+
+    store.import_json(catalog, merge=True)
+
+    assert len(store) == 2
+
+def test_importing_another_file_does_not_mark_the_catalog_synced(tmp_path):
+    catalog = tmp_path / "document_metadata.json"
+    store = MetadataStore(tmp_path / "document_metadata.db", catalog)
+    write_catalog(catalog, ["https://bahai.org/aqdas"])
+    edited = tmp_path / "edited.json"
+    write_catalog(edited, ["https://bahai.org/gleanings"])
+    # The other file is newer, so its mtime would hide the catalog's changes
+    os.utime(edited, ns=(catalog.stat().st_mtime_ns + 10**9,) * 2)
+    store.import_json(edited)
+    store.close()
+
+    store = MetadataStore(tmp_path / "document_metadata.db", catalog)
+    assert [url for url, _ in store.items()] == ["https://bahai.org/aqdas"]
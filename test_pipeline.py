@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Tests for the staged library build pipeline
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from pipeline import pipeline_graph
+
+def make_graph(root):
+    return pipeline_graph(root / "pipeline_state.json", root / "documents", root / "text", root / "text",
+                          cache_dir=root / "stage-outputs")
+
+def test_collect_is_rerun_not_restored_from_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "text").mkdir()
+    assert make_graph(tmp_path).run(max_workers=1, stages={'collect'})['collect'] == 'built'
+    summary = tmp_path / "documents" / "COLLECTION_SUMMARY.md"
+    collected = sorted(path for path in (tmp_path / "documents").rglob("*.txt"))
+    assert collected
+
+    summary.unlink()
+    collected[0].unlink()
+
+    assert make_graph(tmp_path).run(max_workers=1, stages={'collect'})['collect'] == 'built'
+    assert summary.exists() and collected[0].exists()
+
+def test_building_the_graph_creates_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    graph = make_graph(tmp_path)
+    assert 'package' in graph.stale_nodes()
+    assert not (tmp_path / "releases").exists()
+
+def test_verify_report_follows_the_documents_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    graph = make_graph(tmp_path)
+    assert graph.nodes['verify'].outputs == [tmp_path / "documents" / ".cache" / "verification.json"]
+    assert graph.nodes['verify'].outputs[0] in graph.nodes['package'].inputs
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Tests for exporting indexed documents to PDF
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "scripts"))
+from text_to_pdf_converter import BahaiTextToPDFConverter
+
+def write_index(db_path, documents):
+    conn = sqlite3.connect(db_path)
+    conn.executescript('''
+        CREATE TABLE documents (id INTEGER PRIMARY KEY, title TEXT, author TEXT, category TEXT,
+                                description TEXT, file_path TEXT);
+        CREATE TABLE pages (document_id INTEGER, page_number INTEGER, page_text TEXT);
+    ''')
+    for document_id, (title, file_path) in enumerate(documents, 1):
+        conn.execute("INSERT INTO documents VALUES (?, ?, 'Bahaullah', 'Holy Text', '', ?)",
+                     (document_id, title, file_path))
+        conn.execute("INSERT INTO pages VALUES (?, 1, ?)", (document_id, f"The text of {title}."))
+    conn.commit()
+    conn.close()
+
+def test_documents_with_the_same_stem_get_separate_pdfs(tmp_path):
+    db_path = tmp_path / "bahai_documents.db"
+    write_index(db_path, [("Hidden Words (text)", "documents\\confirmed-official\\hidden_words.txt"),
+                          ("Hidden Words (scan)", "documents/confirmed-official/hidden_words.pdf"),
+                          ("Gleanings", "documents/confirmed-official/gleanings.txt")])
+    converter = BahaiTextToPDFConverter(output_dir=tmp_path / "exports")
+
+    pdf_files = converter.export_documents(db_path, workers=2)
+
+    assert sorted(path.relative_to(tmp_path / "exports").as_posix() for path in pdf_files) == [
+        "Holy Text/gleanings.pdf", "Holy Text/hidden_words-1.pdf", "Holy Text/hidden_words-2.pdf"]